@@ -1,89 +1,504 @@
+import heapq
+import numpy as np
+from bisect import bisect_right, insort
 from collections import defaultdict
 import config
 import utils
 from cluster import Cluster
 
 
+def name_key(p):
+    return (p.fn(), p.mns(), p.ln())
+
+
+def mention_order(m):
+    """A total order on mentions that does not depend on how they were loaded
+    """
+    return (m.full_name(), m.article_id, m.original_name, m.author_id)
+
+
+def compatible_pairs(parts):
+    """Yields the pairs of positions (i, j), i < j, of the items in c{parts}
+    with compatible names. Each distinct name is only compared with the names
+    sharing its last name and first name, or first initial for initials.
+    """
+    by_name = defaultdict(list)
+    for i, p in enumerate(parts):
+        by_name[name_key(p)].append(i)
+    names = by_name.keys()
+
+    by_fn = defaultdict(list)
+    by_initial = defaultdict(list)
+    for a, (fn, mns, ln) in enumerate(names):
+        by_fn[(ln, fn)].append(a)
+        by_initial[(ln, fn[0])].append(a)
+
+    for a, (fn, mns, ln) in enumerate(names):
+        positions = by_name[names[a]]
+        for x in xrange(len(positions)):
+            for y in xrange(x + 1, len(positions)):
+                yield positions[x], positions[y]
+
+        if len(fn) == 1:
+            candidates = by_initial[(ln, fn)]
+        else:
+            candidates = by_fn[(ln, fn)] + by_fn.get((ln, fn[0]), [])
+        for b in candidates:
+            if b > a and utils.compatible_names(parts[positions[0]],
+                                                parts[by_name[names[b]][0]]):
+                for i in positions:
+                    for j in by_name[names[b]]:
+                        yield min(i, j), max(i, j)
+
+
+class CandidateIndex():
+    """Indexes a list of clusters by their current names, to find the
+    clusters after a given position whose names are compatible with its
+    name. The index must be told of merges, which can change names.
+    """
+
+    def __init__(self, parts):
+        self.parts = parts
+        self.names = [None] * len(parts)
+        # the sorted positions of the clusters with each name
+        self.positions = defaultdict(list)
+        self.by_fn = defaultdict(set)
+        self.by_initial = defaultdict(set)
+        self.compatible = {}
+        for i in xrange(len(parts)):
+            self.add(i)
+
+    def add(self, i):
+        name = self.names[i] = name_key(self.parts[i])
+        fn, mns, ln = name
+        if name not in self.positions:
+            self.by_fn[(ln, fn)].add(name)
+            self.by_initial[(ln, fn[0])].add(name)
+        insort(self.positions[name], i)
+
+    def remove(self, i):
+        name = self.names[i]
+        positions = self.positions[name]
+        del positions[bisect_right(positions, i) - 1]
+        if not positions:
+            fn, mns, ln = name
+            del self.positions[name]
+            self.by_fn[(ln, fn)].discard(name)
+            self.by_initial[(ln, fn[0])].discard(name)
+        self.names[i] = None
+
+    def update(self, i):
+        """Re-indexes the cluster at c{i}, e.g. after another was merged into it
+        """
+        self.remove(i)
+        self.add(i)
+
+    def is_compatible(self, name1, name2):
+        key = (name1, name2)
+        if key not in self.compatible:
+            self.compatible[key] = utils.compatible_names(
+                self.parts[self.positions[name1][0]],
+                self.parts[self.positions[name2][0]])
+        return self.compatible[key]
+
+    def compatible_names(self, name):
+        """The indexed names compatible with c{name}, which must be indexed
+        """
+        fn, mns, ln = name
+        if len(fn) == 1:
+            candidates = self.by_initial[(ln, fn)]
+        else:
+            candidates = self.by_fn[(ln, fn)] | self.by_fn.get((ln, fn[0]), set())
+        return [other for other in candidates if self.is_compatible(name, other)]
+
+    def later(self, i):
+        """The positions after c{i} of the clusters with names compatible with
+        the name of the cluster at c{i}, in increasing order
+        """
+        ret = []
+        for other in self.compatible_names(self.names[i]):
+            positions = self.positions[other]
+            ret.extend(positions[bisect_right(positions, i):])
+        ret.sort()
+        return ret
+
+    def later_names(self, i):
+        """The names compatible with the name of the cluster at c{i} of the
+        clusters after c{i}, as (first position after c{i}, name) pairs
+        """
+        ret = []
+        for other in self.compatible_names(self.names[i]):
+            positions = self.positions[other]
+            k = bisect_right(positions, i)
+            if k < len(positions):
+                ret.append((positions[k], other))
+        return ret
+
+    def nearby(self, i, limit=None):
+        """The positions of the other clusters with names compatible with the
+        name of the cluster at c{i}, in increasing order, up to c{limit} of
+        the nearest on either side of c{i}
+        """
+        positions = []
+        for other in self.compatible_names(self.names[i]):
+            positions.extend(self.positions[other])
+        positions.sort()
+        k = bisect_right(positions, i)
+        # positions[k - 1] is i itself
+        before, after = positions[:k - 1], positions[k:]
+        if limit is not None:
+            before, after = before[max(0, len(before) - limit):], after[:limit]
+        return before + after
+
+
 class Agglomerator():
 
     CLUSTERS = set()
-    MENTION_TO_CLUSTER = {}
+    # mentions are joined as their clusters merge, and resolve to the live
+    # cluster that owns them
+    MENTION_TO_CLUSTER = utils.DisjointSet()
     INSTANCES = set()
+    # called with (c_source, c_target) before every merge
+    LISTENERS = []
+    # the live clusters, by token; clusters renamed through c{rename} are
+    # re-keyed, and merged-away clusters removed
+    TOKEN_TO_CLUSTERS = defaultdict(set)
+
+    @classmethod
+    def reset(cls):
+        """Clears the class-level state shared by all agglomerators
+        """
+        cls.CLUSTERS.clear()
+        cls.MENTION_TO_CLUSTER.clear()
+        cls.INSTANCES.clear()
+        cls.TOKEN_TO_CLUSTERS.clear()
+        del cls.LISTENERS[:]
 
     def __init__(self, mentions):
+        mentions = sorted(mentions, key=mention_order)
         self.load_clusters(mentions)
         self.INSTANCES.add(self)
-        self.load_compat_mat(mentions)
+        # built on first use, since merges do not need them
+        self.compat_map = self.compat_bits = None
+        self.partition_bits = {}
+        # when not None, do_self_merge appends the ranks of the clusters
+        # it merges, for c{replay_merges}
+        self.merge_log = None
+
+    def cluster_order(self, c):
+        # ties between equal names are broken by rank, not by set order
+        return (c.full_name(), self.rank[c])
 
     def pairs_iter(self):
-        clusters_list = sorted(list(self.clusters), key=lambda c: c.full_name())
+        clusters_list = sorted(list(self.clusters), key=self.cluster_order)
+        index = CandidateIndex(clusters_list)
         for i in xrange(len(clusters_list)):
-            for j in xrange(i + 1, len(clusters_list)):
-                c1, c2 = clusters_list[i], clusters_list[j]
-                if utils.compatible_names(c1, c2):
-                    yield (c1, c2)
+            for j in index.later(i):
+                yield (clusters_list[i], clusters_list[j])
 
     def safe_pairs_iter(self):
         for c1, c2 in self.pairs_iter():
-            if utils.compatible_names(c1, c2):
-                if self.stricter_than(c1, c2) or self.stricter_than(c2, c1)\
-                    or self.is_equivalent(c1, c2):
-                    yield (c1, c2)
+            if self.stricter_than(c1, c2) or self.stricter_than(c2, c1)\
+                or self.is_equivalent(c1, c2):
+                yield (c1, c2)
+
+    def load_compat_mat(self):
+        """Maps each mention to the set of mentions with compatible names.
+        Names are compared once per pair of distinct names, through
+        c{compatible_pairs}, and mentions with the same name share one set.
+        """
+        by_name = defaultdict(list)
+        for m in (c.seed for c in self.ranked):
+            by_name[name_key(m)].append(m)
+        groups = by_name.values()
+
+        # each distinct name gets a bit, so the names compatible with a
+        # mention, or with all of a cluster's mentions, form an integer bitset
+        compat_sets = [set(group) for group in groups]
+        compat_bits = [1 << i for i in xrange(len(groups))]
+        for i, j in compatible_pairs([group[0] for group in groups]):
+            compat_sets[i].update(groups[j])
+            compat_sets[j].update(groups[i])
+            compat_bits[i] |= 1 << j
+            compat_bits[j] |= 1 << i
 
-    def load_compat_mat(self, mentions):
         self.compat_map = defaultdict(set)
-        for m1 in mentions:
-            for m2 in mentions:
-                if utils.compatible_names(m1, m2):
-                    self.compat_map[m1].add(m2)
+        self.compat_bits = {}
+        for group, compat, bits in zip(groups, compat_sets, compat_bits):
+            for m in group:
+                self.compat_map[m] = compat
+                self.compat_bits[m] = bits
 
     def get_partition_compat(self, c):
+        if self.compat_map is None:
+            self.load_compat_mat()
         compat_maps = [self.compat_map[m] for m in c]
         return reduce(set.intersection, compat_maps)
 
+    def get_partition_bits(self, c):
+        """The names compatible with every mention of c{c}, as a bitset
+        """
+        bits = self.partition_bits.get(c)
+        if bits is None:
+            if self.compat_bits is None:
+                self.load_compat_mat()
+            bits = reduce(int.__and__, [self.compat_bits.get(m, 0) for m in c])
+            self.partition_bits[c] = bits
+        return bits
+
     def stricter_than(self, c_loose, c_strict):
-        compat1 = self.get_partition_compat(c_loose)
-        compat2 = self.get_partition_compat(c_strict)
-        return compat1 > compat2
+        compat1 = self.get_partition_bits(c_loose)
+        compat2 = self.get_partition_bits(c_strict)
+        return compat1 != compat2 and compat1 & compat2 == compat2
 
     def is_equivalent(self, c1, c2):
-        compat1 = self.get_partition_compat(c1)
-        compat2 = self.get_partition_compat(c2)
-        return compat1 == compat2
+        return self.get_partition_bits(c1) == self.get_partition_bits(c2)
 
     def load_clusters(self, mentions):
+        """Makes a singleton cluster of each mention. A cluster's rank is the
+        position of the mention it started from.
+        """
         self.clusters = set()
+        self.ranked = []
+        self.rank = {}
         for m in mentions:
             c = Cluster(m)
             c.parent = self
+            self.rank[c] = len(self.ranked)
+            self.ranked.append(c)
             self.clusters.add(c)
             self.CLUSTERS.add(c)
+            self.TOKEN_TO_CLUSTERS[c.token()].add(c)
             self.MENTION_TO_CLUSTER[m] = c
 
     def distinct_authors(self, name_intersection):
         return 1
 
+    @classmethod
+    def unindex(cls, c, token):
+        clusters = cls.TOKEN_TO_CLUSTERS.get(token)
+        if clusters is not None:
+            clusters.discard(c)
+            if not clusters:
+                del cls.TOKEN_TO_CLUSTERS[token]
+
+    @classmethod
+    def rename(cls, c, mutation):
+        """Applies c{mutation} to the name of c{c}, e.g.
+        c{Cluster.drop_first_name}, and re-keys c{c} if its token changed
+        """
+        old_token = c.token()
+        mutation(c)
+        token = c.token()
+        if token != old_token:
+            cls.unindex(c, old_token)
+            cls.TOKEN_TO_CLUSTERS[token].add(c)
+
     @classmethod
     def do_static_merge(cls, c_source, c_target):
         """By the time we're just folding in clusters, there's no need to maintain
         self.INSTANCES and self.clusters, so we just call this method
         """
-        c_target.extend(c_source)
+        for listener in cls.LISTENERS:
+            listener(c_source, c_target)
+        for c in (c_source, c_target):
+            if c.parent is not None:
+                c.parent.partition_bits.pop(c, None)
+        cls.unindex(c_source, c_source.token())
+        cls.rename(c_target, lambda c: c.extend(c_source))
         c_source.parent = c_target.parent
         cls.CLUSTERS.remove(c_source)
-        for m in c_source.mentions:
-            cls.MENTION_TO_CLUSTER[m] = c_target
+        cls.MENTION_TO_CLUSTER.union(c_source.seed, c_target.seed, c_target)
 
     def do_self_merge(self, c_source, c_target):
+        if self.merge_log is not None:
+            self.merge_log.append((self.rank[c_source], self.rank[c_target]))
+        # the bits of the merged cluster are kept once any have been asked for
+        if self.compat_bits is not None:
+            bits = self.get_partition_bits(c_source) & self.get_partition_bits(c_target)
         self.clusters.remove(c_source)
         self.do_static_merge(c_source, c_target)
+        if self.compat_bits is not None:
+            self.partition_bits[c_target] = bits
 
-    def run_merge(self, similarity, threshold):
-        clusters_list = sorted(list(self.clusters), key=lambda c: c.full_name())
+    def replay_merges(self, merge_log):
+        """Repeats the merges logged by an agglomerator over the same mentions,
+        e.g. one run in another process
+        """
+        for source_rank, target_rank in merge_log:
+            self.do_self_merge(self.ranked[source_rank], self.ranked[target_rank])
+
+    def discard(self):
+        """Removes this agglomerator and its clusters from the class-level
+        state
+        """
+        self.INSTANCES.discard(self)
+        for c in self.clusters:
+            self.CLUSTERS.discard(c)
+            self.unindex(c, c.token())
+            self.MENTION_TO_CLUSTER.remove_sets(c)
+
+    def run_merge(self, similarity, threshold, clusters=None, skip_pair=None):
+        if clusters is None:
+            clusters = self.clusters
+        clusters_list = sorted(list(clusters), key=self.cluster_order)
+        # c{similarity} is zero for incompatible names, so only compatible
+        # pairs are scored, and none for which c{skip_pair} is true
+        index = CandidateIndex(clusters_list)
         for i in xrange(len(clusters_list)):
-            for j in xrange(i + 1, len(clusters_list)):
+            for j in index.later(i):
                 c1, c2 = clusters_list[i], clusters_list[j]
+                if skip_pair is not None and skip_pair(c1, c2):
+                    continue
                 if similarity(c1, c2) > threshold:
                     self.do_self_merge(c1, c2)
+                    index.remove(i)
+                    index.update(j)
                     break
 
+    def run_best_first_merge(self, similarity, threshold, clusters=None,
+                             skip_pair=None):
+        """Repeatedly merges the pair of compatible clusters with the highest
+        c{similarity}, until none is above c{threshold}. Candidates come from
+        a c{CandidateIndex}: each cluster is scored against the compatible
+        clusters after it, and after a merge, the merged cluster against the
+        compatible clusters on either side. With
+        c{config.best_first_candidates}, only that many nearest in name order
+        are scored, which can miss pairs above c{threshold}. Scores are kept
+        in a heap, where the entries of the two old clusters go stale. Pairs
+        for which c{skip_pair} is true are not scored until one side is
+        merged.
+        """
+        if clusters is None:
+            clusters = self.clusters
+        clusters_list = sorted(list(clusters), key=self.cluster_order)
+        alive = [True] * len(clusters_list)
+        versions = [0] * len(clusters_list)
+        index = CandidateIndex(clusters_list)
+        limit = config.best_first_candidates
+        heap = []
+
+        def push(i, j):
+            if i > j:
+                i, j = j, i
+            score = similarity(clusters_list[i], clusters_list[j])
+            if score > threshold:
+                heapq.heappush(heap, (-score, i, j, versions[i], versions[j]))
+
+        for i in xrange(len(clusters_list)):
+            for j in index.later(i)[:limit]:
+                if skip_pair is None or not skip_pair(clusters_list[i], clusters_list[j]):
+                    push(i, j)
+
+        while heap:
+            score, i, j, version_i, version_j = heapq.heappop(heap)
+            if not (alive[i] and alive[j]) or \
+                    version_i != versions[i] or version_j != versions[j]:
+                continue
+
+            self.do_self_merge(clusters_list[i], clusters_list[j])
+            alive[i] = False
+            versions[j] += 1
+            index.remove(i)
+            index.update(j)
+            for k in index.nearby(j, limit):
+                push(j, k)
+
+    def run_batch_merge(self, batch_similarity, threshold, clusters=None):
+        """Like c{run_merge}, but with scores from c{batch_similarity}, which
+        takes a list of clusters and two arrays of positions in it, and
+        returns an array with the score of each pair of positions. Scores
+        must depend only on the names of the two clusters: each pair of
+        compatible names is scored once, and the pairs of the names coming
+        up are scored ahead, up to c{config.batch_size} at a time.
+        """
+        if clusters is None:
+            clusters = self.clusters
+        clusters_list = sorted(list(clusters), key=self.cluster_order)
+        n = len(clusters_list)
+        index = CandidateIndex(clusters_list)
+        scores = {}
+
+        def score(pairs):
+            names = list(set(name for pair in pairs for name in pair))
+            local = dict((name, k) for k, name in enumerate(names))
+            rows1 = np.array([local[a] for a, b in pairs], dtype=np.int64)
+            rows2 = np.array([local[b] for a, b in pairs], dtype=np.int64)
+            parts = [clusters_list[index.positions[name][0]] for name in names]
+            scores.update(zip(pairs, batch_similarity(parts, rows1, rows2)))
+
+        def unscored(i):
+            name = index.names[i]
+            return [(name, other) for k, other in index.later_names(i)
+                    if (name, other) not in scores]
+
+        scored_to = 0
+        for i in xrange(n - 1):
+            if i >= scored_to:
+                # only the first cluster with each name has pairs not seen
+                # earlier in the window
+                pairs, seen = set(), set()
+                while scored_to < n - 1 and len(pairs) < config.batch_size:
+                    if index.names[scored_to] not in seen:
+                        seen.add(index.names[scored_to])
+                        pairs.update(unscored(scored_to))
+                    scored_to += 1
+                if pairs:
+                    score(list(pairs))
+
+            # merges since the window was scored can give new names
+            missing = unscored(i)
+            if missing:
+                score(missing)
+
+            name = index.names[i]
+            above = [k for k, other in index.later_names(i)
+                     if scores[(name, other)] > threshold]
+            if above:
+                j = min(above)
+                self.do_self_merge(clusters_list[i], clusters_list[j])
+                index.remove(i)
+                index.update(j)
+
+    def canopies(self, max_size):
+        """Splits the clusters into canopies of at most c{max_size}: by full
+        first name, with initials in a canopy of their own, then canopies
+        still too large by first middle initial, and then into runs of
+        consecutive names. Clusters in different canopies can still be
+        compatible, e.g. "j" and "jun", or "jun q" and "jun w q".
+        """
+        if len(self.clusters) <= max_size:
+            return [sorted(self.clusters, key=self.cluster_order)]
+
+        by_fn = defaultdict(list)
+        for c in self.clusters:
+            by_fn[c.fn() if len(c.fn()) > 1 else None].append(c)
+
+        ret = []
+        for fn in sorted(by_fn):
+            group = by_fn[fn]
+            if len(group) <= max_size:
+                ret.append(group)
+                continue
+            by_mn = defaultdict(list)
+            for c in group:
+                by_mn[c.mns()[0][0] if c.mns() else None].append(c)
+            for mn in sorted(by_mn):
+                run = sorted(by_mn[mn], key=self.cluster_order)
+                ret.extend(run[k:k + max_size] for k in xrange(0, len(run), max_size))
+        return [sorted(canopy, key=self.cluster_order) for canopy in ret]
+
+    def run_canopy_merge(self, merge, similarity, threshold, max_size):
+        """Runs c{merge}, e.g. c{self.run_merge}, on each of the c{canopies}
+        separately, then reconciles them with c{merge} over the surviving
+        clusters. Only pairs from different canopies are scored then, the
+        others having been scored already.
+        """
+        canopy_of = {}
+        for k, canopy in enumerate(self.canopies(max_size)):
+            merge(similarity, threshold, canopy)
+            for c in canopy:
+                canopy_of[c] = k
+
+        merge(similarity, threshold,
+              skip_pair=lambda c1, c2: canopy_of[c1] == canopy_of[c2])
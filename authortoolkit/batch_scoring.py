@@ -0,0 +1,153 @@
+"""Vectorized scoring of many candidate name pairs at once.
+
+Name parts are encoded as integer ids whose counts are kept in arrays, so
+the prior probability that two names belong to the same author can be
+computed for a whole batch of pairs in NumPy. Probabilities are multiplied
+in log space, which avoids underflow for long names.
+"""
+
+import numpy as np
+import config
+
+
+PAD = 0
+
+
+def grow(a, size):
+    """c{a}, copied into a larger array if it is shorter than c{size}
+    """
+    if len(a) < size:
+        a = np.concatenate([a, np.zeros(size - len(a), dtype=a.dtype)])
+    return a
+
+
+def append(a, n, value):
+    """Sets c{a[n]}, doubling c{a} first if it is full; returns c{a}
+    """
+    if n == len(a):
+        a = grow(a, 2 * len(a))
+    a[n] = value
+    return a
+
+
+class NameEncoder():
+    """Assigns ids to the name parts scored under a c{PriorNameDist}. Counts
+    are kept in arrays that double in size as ids are added, and
+    log-probabilities are computed only for new ids, so that scoring does not
+    slow down as the vocabulary grows.
+    """
+
+    def __init__(self, pnd):
+        self.pnd = pnd
+        # id 0 pads short lists of middle names, and has length 0 and count 0
+        self.given_ids = {}
+        self.given_counts = np.zeros(64)
+        self.given_lengths = np.zeros(64, dtype=np.int64)
+        self.num_given = 1
+        self.last_ids = {}
+        self.last_counts = np.zeros(64)
+        self.num_last = 0
+        # log-probabilities, computed for the first num_logged ids so far
+        self.log_given = np.zeros(0)
+        self.log_last = np.zeros(0)
+        self.num_logged_given = self.num_logged_last = 0
+        self.totals = None
+
+    def given_id(self, name):
+        i = self.given_ids.get(name)
+        if i is None:
+            i = self.given_ids[name] = self.num_given
+            f_map = self.pnd.fn_map if len(name) > 1 else self.pnd.fl_map
+            self.given_counts = append(self.given_counts, i, f_map.count(name))
+            self.given_lengths = append(self.given_lengths, i, len(name))
+            self.num_given += 1
+        return i
+
+    def last_id(self, name):
+        i = self.last_ids.get(name)
+        if i is None:
+            i = self.last_ids[name] = self.num_last
+            self.last_counts = append(self.last_counts, i, self.pnd.ln_map.count(name))
+            self.num_last += 1
+        return i
+
+    def encode(self, p):
+        return (self.given_id(p.fn()), [self.given_id(mn) for mn in p.mns()],
+                self.last_id(p.ln()))
+
+    def encode_parts(self, parts):
+        """Encodes a list of names as id arrays: first names, middle names
+        padded to the longest list, and last names
+        """
+        codes = [self.encode(p) for p in parts]
+        width = max([len(c[1]) for c in codes] + [1])
+        fn = np.array([c[0] for c in codes], dtype=np.int64)
+        mns = np.array([c[1] + [PAD] * (width - len(c[1])) for c in codes],
+                       dtype=np.int64).reshape(len(codes), width)
+        ln = np.array([c[2] for c in codes], dtype=np.int64)
+        return fn, mns, ln
+
+    def encode_pairs(self, pairs):
+        """Encodes a list of name pairs as id arrays: first names, padded
+        middle names and last names of each side
+        """
+        fn, mns, ln = self.encode_parts([p for pair in pairs for p in pair])
+        return fn[0::2], fn[1::2], mns[0::2], mns[1::2], ln[0::2]
+
+    def log_props(self):
+        """Returns the log-probabilities of the given names and last names
+        seen so far, along with the lengths of the given names, indexed by id
+        """
+        totals = (self.pnd.fn_map.total, self.pnd.fl_map.total, self.pnd.ln_map.total)
+        if totals != self.totals:
+            # the counts changed, so every log-probability is recomputed
+            self.totals = totals
+            self.num_logged_given = self.num_logged_last = 0
+        fn_total, fl_total, ln_total = [np.log1p(float(t)) for t in totals]
+
+        self.log_given = grow(self.log_given, len(self.given_counts))
+        start, end = self.num_logged_given, self.num_given
+        if start < end:
+            log_totals = np.where(self.given_lengths[start:end] > 1, fn_total, fl_total)
+            self.log_given[start:end] = np.log1p(self.given_counts[start:end]) - log_totals
+            self.log_given[PAD] = 0.
+            self.num_logged_given = end
+
+        self.log_last = grow(self.log_last, len(self.last_counts))
+        start, end = self.num_logged_last, self.num_last
+        if start < end:
+            self.log_last[start:end] = np.log1p(self.last_counts[start:end]) - ln_total
+            self.num_logged_last = end
+
+        return self.log_given, self.log_last, self.given_lengths
+
+    def log_common_prob_gen(self, fn1, fn2, mns1, mns2, ln):
+        """The log of c{PriorNameDist.common_prob_gen} for each encoded pair
+        """
+        log_given, log_last, lengths = self.log_props()
+
+        fn = np.where(lengths[fn1] < lengths[fn2], fn1, fn2)
+        ret = log_given[fn] + log_last[ln]
+
+        same_count = (mns1 != PAD).sum(axis=1) == (mns2 != PAD).sum(axis=1)
+        mns = np.where(lengths[mns1] < lengths[mns2], mns1, mns2)
+        ret += np.where(same_count[:, None], log_given[mns], 0.).sum(axis=1)
+        return ret
+
+    def prob_same(self, fn1, fn2, mns1, mns2, ln):
+        """The probability that each encoded pair of names, assumed to be
+        compatible, belongs to one author: 1 / (1 + expected_others)
+        """
+        log_gen = self.log_common_prob_gen(fn1, fn2, mns1, mns2, ln)
+        log_others = np.log(config.expected_authors) + log_gen
+        return np.exp(-np.logaddexp(0., log_others))
+
+    def pairs_prob_same(self, pairs):
+        return self.prob_same(*self.encode_pairs(pairs))
+
+    def indexed_prob_same(self, parts, rows1, rows2):
+        """The probability for each c{k} that c{parts[rows1[k]]} and
+        c{parts[rows2[k]]} belong to one author; each part is encoded once
+        """
+        fn, mns, ln = self.encode_parts(parts)
+        return self.prob_same(fn[rows1], fn[rows2], mns[rows1], mns[rows2], ln[rows1])
@@ -4,12 +4,17 @@ from mention import Mention
 
 
 class Cluster (Mention):
+    __slots__ = ("mentions", "articles", "parent", "seed")
+
     def __init__(self, seed_m):
-        self.mentions = set([seed_m])
-        self.articles = set([seed_m.article_id])
+        # singleton clusters hold tuples; sets are allocated on the first merge
+        self.seed = seed_m
+        self.mentions = (seed_m,)
+        self.articles = (seed_m.article_id,)
         self.first_name = seed_m.fn()
         self.middle_names = seed_m.mns()
         self.last_name = seed_m.ln()
+        self.parent = None
 
     def __str__(self):
         return self.full_name()
@@ -18,8 +23,21 @@ class Cluster (Mention):
         return self.mentions.__iter__()
 
     def extend(self, source_c):
-        self.mentions.update(source_c.mentions)
-        self.articles.update(source_c.articles)
+        """Adds the mentions of c{source_c}, which is merged away: when its
+        sets are the larger ones, they are taken over and the smaller ones
+        copied into them
+        """
+        if len(source_c.mentions) > len(self.mentions) and \
+                type(source_c.mentions) is set:
+            source_c.mentions.update(self.mentions)
+            source_c.articles.update(self.articles)
+            self.mentions, self.articles = source_c.mentions, source_c.articles
+        else:
+            if type(self.mentions) is tuple:
+                self.mentions = set(self.mentions)
+                self.articles = set(self.articles)
+            self.mentions.update(source_c.mentions)
+            self.articles.update(source_c.articles)
         self.first_name = max(self.fn(), source_c.fn(), key=len)
         self.middle_names = max(self.mns(), source_c.mns(), key=len)
 
@@ -33,4 +51,23 @@ class Cluster (Mention):
         return len(self.mentions)
 
     def shared_articles(self, c):
-        return self.articles.intersection(c.articles)
+        small, large = sorted((self.articles, c.articles), key=len)
+        return set(a for a in small if a in large)
+
+
+class ClusterView (Mention):
+    """A cluster under the name a mutation, e.g. c{Mention.drop_first_name},
+    would give it, without changing the cluster
+    """
+    __slots__ = ("cluster", "mutation")
+
+    def __init__(self, cluster, mutation):
+        self.cluster = cluster
+        self.mutation = mutation
+        self.first_name = cluster.fn()
+        self.middle_names = cluster.mns()
+        self.last_name = cluster.ln()
+        mutation(self)
+
+    def __str__(self):
+        return self.full_name()
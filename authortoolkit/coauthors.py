@@ -0,0 +1,150 @@
+"""The coauthors of each cluster, kept up to date as clusters merge.
+
+For each cluster we keep the multiset of the clusters of its mentions'
+coauthors, i.e. one count per pair of distinct mentions on the same article.
+A merge folds the source's counts into the target's, and the clusters that
+counted the source count the target instead.
+
+The multisets can be loaded all at once from a sparse mention-article
+incidence matrix, and the coauthors shared by every pair of clusters in a
+block counted with one sparse product.
+"""
+
+from collections import defaultdict
+import numpy as np
+from scipy import sparse
+
+
+def incidence_matrix(mentions):
+    """Returns the position of each mention, and the CSR matrix with a row per
+    mention and a one in the column of its article
+    """
+    mention_index = {}
+    article_index = {}
+    columns = []
+    for m in mentions:
+        mention_index[m] = len(columns)
+        columns.append(article_index.setdefault(m.article_id, len(article_index)))
+    n = len(columns)
+    matrix = sparse.csr_matrix(
+        (np.ones(n, dtype=np.int32), np.array(columns, dtype=np.int32),
+         np.arange(n + 1)), shape=(n, len(article_index)))
+    return mention_index, matrix
+
+
+def binary_rows(rows, columns):
+    """The CSR matrix with a one in each row for each key of its dict in
+    c{rows}, with columns numbered by c{columns}
+    """
+    indices = []
+    indptr = [0]
+    for row in rows:
+        indices.extend(columns.setdefault(k, len(columns)) for k in row)
+        indptr.append(len(indices))
+    return sparse.csr_matrix(
+        (np.ones(len(indices), dtype=np.int32), np.array(indices, dtype=np.int32),
+         np.array(indptr)), shape=(len(rows), len(columns)))
+
+
+class CoauthorIndex():
+    def __init__(self, article_to_mentions, mention_to_cluster):
+        self.article_to_mentions = article_to_mentions
+        self.mention_to_cluster = mention_to_cluster
+        self.coauthors = {}
+        # the shared coauthor counts from the last c{prepare_pairs}, valid
+        # for the pairs of clusters both still in c{prepared}
+        self.pair_counts = {}
+        self.prepared = set()
+
+    def build(self, c):
+        counts = defaultdict(int)
+        for m in c.mentions:
+            for co_m in self.article_to_mentions[m.article_id]:
+                if m != co_m:
+                    counts[self.mention_to_cluster[co_m]] += 1
+        return counts
+
+    def load(self, clusters, mention_index, incidence):
+        """Builds the coauthors of all c{clusters} from the c{incidence_matrix}
+        of their mentions, as c{Z' (B B' - I) Z}, where c{B} is the incidence
+        matrix and c{Z} assigns mentions to clusters. It is computed as
+        c{(Z' B) (Z' B)' - Z' Z}, through the clusters' article counts, since
+        c{B B'} has a nonzero for every pair of mentions on an article.
+        """
+        clusters = list(clusters)
+        rows, columns = [], []
+        for j, c in enumerate(clusters):
+            for m in c.mentions:
+                rows.append(mention_index[m])
+                columns.append(j)
+        assignment = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int32), (rows, columns)),
+            shape=(incidence.shape[0], len(clusters)))
+
+        articles = assignment.T.dot(incidence).tocsr()
+        # Z' Z counts each cluster's mentions, on the diagonal
+        sizes = np.bincount(columns, minlength=len(clusters)).astype(np.int32)
+        counts = (articles.dot(articles.T) - sparse.diags(sizes, format="csr")).tocsr()
+        counts.eliminate_zeros()
+
+        for i, c in enumerate(clusters):
+            row = defaultdict(int)
+            start, end = counts.indptr[i], counts.indptr[i + 1]
+            for j, count in zip(counts.indices[start:end], counts.data[start:end]):
+                row[clusters[j]] = int(count)
+            self.coauthors[c] = row
+
+    def prepare_pairs(self, clusters):
+        """Counts the coauthors shared by every pair of c{clusters} at once,
+        for c{num_common}, replacing the counts of the last call
+        """
+        clusters = list(clusters)
+        coauthors = binary_rows([self.get(c) for c in clusters], {})
+        shared = coauthors.dot(coauthors.T).tocoo()
+        self.pair_counts = dict(((clusters[i], clusters[j]), int(count))
+                                for i, j, count in
+                                zip(shared.row, shared.col, shared.data))
+        self.prepared = set(clusters)
+
+    def get(self, c):
+        """The coauthor clusters of c{c}, with counts
+        """
+        counts = self.coauthors.get(c)
+        if counts is None:
+            counts = self.coauthors[c] = self.build(c)
+        return counts
+
+    def num_common(self, c1, c2):
+        if c1 in self.prepared and c2 in self.prepared:
+            return self.pair_counts.get((c1, c2), 0)
+        counts1, counts2 = self.get(c1), self.get(c2)
+        if len(counts1) > len(counts2):
+            counts1, counts2 = counts2, counts1
+        return sum(1 for k in counts1 if k in counts2)
+
+    def on_merge(self, c_source, c_target):
+        """Called by c{Agglomerator.do_static_merge} before c{c_source} is
+        merged into c{c_target}
+        """
+        source_counts = self.get(c_source)
+        target_counts = self.get(c_target)
+        del self.coauthors[c_source]
+
+        # the coauthors of these clusters change, and so do their shared counts
+        if self.prepared:
+            self.prepared.discard(c_source)
+            self.prepared.discard(c_target)
+            self.prepared.difference_update(source_counts)
+
+        for k, count in source_counts.iteritems():
+            target_counts[k] += count
+        if c_source in target_counts:
+            # the two clusters were coauthors, so the target is now its own
+            target_counts[c_target] += target_counts.pop(c_source)
+
+        for k in source_counts:
+            if k is c_source or k is c_target:
+                continue
+            counts = self.coauthors.get(k)
+            if counts is not None:
+                counts[c_target] += counts.pop(c_source)
@@ -9,6 +9,47 @@ expected_authors = 9000
 bootstrap_threshold = 0.9
 merge_threshold = 0.6
 
+# maximum number of name scores kept by PriorNameDist (None for no limit)
+score_cache_size = 1000000
+
+# score the candidate pairs of a block with vectorized calls, of up to
+# batch_size pairs each
+batch_scoring = False
+batch_size = 100000
+
+# how blocks are merged: "greedy" merges each cluster into the first later
+# cluster scoring above the threshold, "best_first" always merges the best
+# scoring pair left in the block (unless best_first_candidates is set)
+merge_engine = "greedy"
+
+# set to approximate the best-first merge: each cluster is then only scored
+# against this many compatible clusters nearest to it in name order, and
+# pairs further apart are never merged, however well they score. None
+# scores every compatible pair
+best_first_candidates = None
+
+# number of processes running the bootstrap merge, one token block at a time
+bootstrap_workers = 1
+
+# blocks with more clusters than this are merged canopy by canopy (by first
+# name, then middle initial) and then reconciled; None to never split them.
+# The bootstrap merge does not split blocks with batch_scoring
+max_block_size = None
+
+# the shared coauthors of all pairs of clusters in blocks with at least this
+# many clusters are counted at once, with a sparse matrix product
+min_coauthor_batch = 50
+
+# approximate name counts (pickle_name_dist --sketch) overestimate a count by
+# at most sketch_epsilon times the total, except with probability sketch_delta.
+# Each count table takes about 4 * e / sketch_epsilon * ln(1 / sketch_delta)
+# bytes, 0.5MB at the default; large runs can lower it (--sketch-epsilon).
+# The distinct names are still kept, without counts, for the spellers
+sketch_epsilon = 1e-4
+sketch_delta = 0.01
+# names counted this many times are counted exactly from then on
+sketch_heavy_count = 100
+
 pc_topic_likelihood = [[.05, .05], [.2, .5]]
 
 p_coauthor = [
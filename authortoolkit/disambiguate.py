@@ -1,13 +1,18 @@
 # -*- coding: utf-8 -*-
 
-import sys, re, random, copy
+import sys, os, re, random, copy
+from multiprocessing import Pool
 from cPickle import load
 from collections import defaultdict
-from cluster import Cluster
-from agglomerator import Agglomerator
-from mention import Mention, MalformedAuthorName
+from cluster import ClusterView
+from agglomerator import Agglomerator, mention_order
+from mention import Mention
 import name_dist
-import speller
+import name_table
+import batch_scoring
+import mention_store
+import coauthors
+import variants
 import output
 import config
 import utils
@@ -15,58 +20,157 @@ import utils
 
 mentions = set()
 article_to_mentions = defaultdict(set)
+# the mentions of each token block, shared with bootstrap worker processes
+token_to_mentions = defaultdict(set)
+# a mention store opened by load_mentions is read one token block at a time,
+# by each process through its own reader, instead of into c{mentions}
+mention_store_path = None
+store_reader = None
+coauthor_index = None
+variant_index = None
+# the largest factor by which k or fewer shared coauthors can raise the odds
+# of a match, and the number of pairs collective_merge ruled out on that bound
+max_coauthor_ratios = None
+pruned_pairs = 0
 
 name_dist = name_dist.PriorNameDist()
+name_encoder = batch_scoring.NameEncoder(name_dist)
 
 
 def load_name_dist(name_dist_file):
     print "loading name_dist"
-    name_dist_fh = open(name_dist_file)
-    pieces = load(name_dist_fh)
-    name_dist_fh.close()
+    if name_table.is_table_file(name_dist_file):
+        pieces = name_table.open_tables(name_dist_file)
+    else:
+        name_dist_fh = open(name_dist_file)
+        pieces = load(name_dist_fh)
+        name_dist_fh.close()
     name_dist.load_pieces(pieces)
 
 
 def load_mentions(in_file):
+    global mention_store_path
     print "loading mentions"
+    if mention_store.is_mention_store(in_file):
+        mention_store_path = in_file
+        print "  %d mentions, read by token block" % len(get_store())
+        return
     pickle_handle = open(in_file, "r")
-    local_mentions = load(pickle_handle)
-    for m in local_mentions:
+    for m in load(pickle_handle):
         mentions.add(m)
 
 
-def name_sameness(p1, p2):
-    if not utils.compatible_names(p1, p2):
-        return 0.
+def get_store():
+    global store_reader
+    if store_reader is None or store_reader[0] != os.getpid():
+        store_reader = (os.getpid(),
+                        mention_store.MentionStoreReader(mention_store_path))
+    return store_reader[1]
+
+
+def block_sizes():
+    """The number of mentions in each token block
+    """
+    if mention_store_path is not None:
+        store = get_store()
+        return dict((t, store.block_size(t)) for t in store.tokens())
+    token_to_mentions.clear()
+    for r in mentions:
+        token_to_mentions[r.token()].add(r)
+    return dict((t, len(b)) for t, b in token_to_mentions.iteritems())
 
-    gen_prob = name_dist.common_prob_gen(p1, p2)
-    expected_others = config.expected_authors * gen_prob
 
-    distinct_names = 1
+def read_block(token):
+    if mention_store_path is not None:
+        return get_store().read_block(token)
+    return token_to_mentions[token]
+
+
+def name_sameness(p1, p2):
+    # prob_same assumes a single author with the intersected name, i.e.
+    # distinct_names = 1
 #    if p1.parent == p2.parent:
 #        agg = p1.parent
 #        intersected_name = Mention.intersected_name(p1, p2)
 #        distinct_names = agg.distinct_authors(intersected_name)
 
-    prob_same = 1. / (distinct_names + expected_others)
+    return name_dist.prob_same(p1, p2)
+
 
-    return prob_same
+def batch_name_sameness(parts, rows1, rows2):
+    """c{name_sameness} of c{parts[rows1[k]]} and c{parts[rows2[k]]} for each
+    c{k}, as an array; the pairs must have compatible names
+    """
+    return name_encoder.indexed_prob_same(parts, rows1, rows2)
 
 
-def bootstrap_merge():
-    print "bootstrap merge [%d clusters]" % len(mentions)
+def run_merge(agg, similarity, threshold):
+    if config.merge_engine == "best_first":
+        merge = agg.run_best_first_merge
+    else:
+        merge = agg.run_merge
+
+    if config.max_block_size and len(agg.clusters) > config.max_block_size:
+        agg.run_canopy_merge(merge, similarity, threshold, config.max_block_size)
+    else:
+        merge(similarity, threshold)
 
-    token_to_mentions = defaultdict(set)
-    for r in mentions:
-        token_to_mentions[r.token()].add(r)
 
-    print "  loading agglomerators"
-    for t, local_mentions in token_to_mentions.iteritems():
-        agg = Agglomerator(local_mentions)
+def bootstrap_block_merge(agg):
+    if config.batch_scoring:
+        agg.run_batch_merge(batch_name_sameness, config.bootstrap_threshold)
+    else:
+        run_merge(agg, name_sameness, config.bootstrap_threshold)
+
+
+def bootstrap_worker(token):
+    """Runs the bootstrap merge of one block in a worker process, returning
+    the merges made, by cluster rank
+    """
+    agg = Agglomerator(read_block(token))
+    agg.merge_log = []
+    bootstrap_block_merge(agg)
+    agg.discard()
+    return token, agg.merge_log
+
+
+def bootstrap_merge(workers=None):
+    if workers is None:
+        workers = config.bootstrap_workers
+    sizes = block_sizes()
+    print "bootstrap merge [%d clusters]" % sum(sizes.itervalues())
+    # the batch merge scores each pair of names once, and does not split blocks
+    split_blocks = config.max_block_size and not config.batch_scoring
+    if split_blocks:
+        print "  block sizes: %s" % utils.size_histogram(sizes.values())
+    canopy_sizes = []
+
+    def load_block(t):
+        agg = Agglomerator(read_block(t))
+        if split_blocks:
+            canopy_sizes.extend(len(canopy)
+                                for canopy in agg.canopies(config.max_block_size))
+        return agg
 
     print "  running merge"
-    for agg in Agglomerator.INSTANCES:
-        agg.run_merge(name_sameness, config.bootstrap_threshold)
+    if workers > 1:
+        # largest blocks first, so that no worker is left with a big block
+        # at the end; blocks are independent, so the merges can be replayed
+        # in any order
+        tokens = sorted(sizes, key=lambda t: (-sizes[t], t))
+        pool = Pool(workers)
+        for t, merge_log in pool.imap_unordered(bootstrap_worker, tokens):
+            load_block(t).replay_merges(merge_log)
+        pool.close()
+        pool.join()
+    else:
+        for t in sorted(sizes):
+            bootstrap_block_merge(load_block(t))
+        print "  score cache: %s" % name_dist.cache
+
+    if split_blocks:
+        print "  block sizes after splitting into canopies: %s" % \
+            utils.size_histogram(canopy_sizes)
 
 
 def bayesian_update(prior, p_given_match, p_given_not):
@@ -75,23 +179,33 @@ def bayesian_update(prior, p_given_match, p_given_not):
     return posterior1 / (posterior1 + posterior0)
 
 
+def load_coauthor_index():
+    global coauthor_index
+    if coauthor_index is not None:
+        return
+    # the mentions are those of the clusters, which may have been read from
+    # a mention store block by block
+    all_mentions = [m for c in Agglomerator.CLUSTERS for m in c.mentions]
+    for m in all_mentions:
+        article_to_mentions[m.article_id].add(m)
+    coauthor_index = coauthors.CoauthorIndex(article_to_mentions,
+                                             Agglomerator.MENTION_TO_CLUSTER)
+    mention_index, incidence = coauthors.incidence_matrix(all_mentions)
+    coauthor_index.load(Agglomerator.CLUSTERS, mention_index, incidence)
+    Agglomerator.LISTENERS.append(coauthor_index.on_merge)
+
+
 def coauthor_likelihoods(p1, p2):
     """returns the likelihoods of observing the actual number coauthors shared 
     by c{p1} and c{p2}, conditioned on whether or not p1 and p2 are a match
     """
-    def get_coauthors(p):
-        ret = set()
-        for m in p.mentions:
-            for co_m in article_to_mentions[m.article_id]:
-                if m != co_m:
-                    co_p = Agglomerator.MENTION_TO_CLUSTER[co_m]
-                    ret.add(co_p)
-        return ret
-
-    def num_common_coauthors(p1, p2):
-        return len(set.intersection(get_coauthors(p1), get_coauthors(p2)))
-
-    num_common = num_common_coauthors(p1, p2)
+    load_coauthor_index()
+    # the coauthors of a renamed cluster are those of the cluster
+    if isinstance(p1, ClusterView):
+        p1 = p1.cluster
+    if isinstance(p2, ClusterView):
+        p2 = p2.cluster
+    num_common = coauthor_index.num_common(p1, p2)
     if num_common >= len(config.p_coauthor[0]):
         num_common = len(config.p_coauthor[0]) - 1
     likelihood0 = config.p_coauthor[0][num_common]
@@ -108,121 +222,208 @@ def collective_sameness(p1, p2):
     return bayesian_update(prior, likelihood1, likelihood0)
 
 
+def could_merge(prior, ratio):
+    # the margin covers rounding, so that no pair that could merge is pruned
+    return bayesian_update(prior, ratio, 1.) >= config.merge_threshold - 1e-9
+
+
+def pruned_collective_sameness(p1, p2):
+    """c{collective_sameness}, except that pairs whose name prior is too low
+    for their possible shared coauthors to lift them above the merge threshold
+    score 0, without counting their coauthors
+    """
+    global pruned_pairs
+    if not utils.compatible_names(p1, p2):
+        return 0.
+    prior = name_sameness(p1, p2)
+    if not could_merge(prior, max_coauthor_ratios[-1]):
+        pruned_pairs += 1
+        return 0.
+    # they share no more coauthors than the one with fewer has
+    most_common = min(len(coauthor_index.get(p1)), len(coauthor_index.get(p2)),
+                      len(max_coauthor_ratios) - 1)
+    if not could_merge(prior, max_coauthor_ratios[most_common]):
+        pruned_pairs += 1
+        return 0.
+    (likelihood1, likelihood0) = coauthor_likelihoods(p1, p2)
+    return bayesian_update(prior, likelihood1, likelihood0)
+
+
 def collective_merge():
+    global max_coauthor_ratios, pruned_pairs
     print "collective merge [%d clusters]" % len(Agglomerator.CLUSTERS)
 
-    for m in mentions:
-        article_to_mentions[m.article_id].add(m)
+    load_coauthor_index()
+    max_coauthor_ratios, ratio = [], 0.
+    for l0, l1 in zip(*config.p_coauthor):
+        ratio = max(ratio, l1 / l0)
+        max_coauthor_ratios.append(ratio)
+    pruned_pairs = 0
 
     for agg in Agglomerator.INSTANCES:
-        agg.run_merge(collective_sameness, config.merge_threshold)
-
+        if len(agg.clusters) >= config.min_coauthor_batch:
+            coauthor_index.prepare_pairs(agg.clusters)
+        run_merge(agg, pruned_collective_sameness, config.merge_threshold)
+    print "  pairs pruned before counting coauthors: %d" % pruned_pairs
+    print "  score cache: %s" % name_dist.cache
 
-def attempt_merge(source_p, possible_targets, likelihoods):
-    max_prob, max_pp = -1, None
-    for pp in possible_targets:
-        base_prob = collective_sameness(source_p, pp)
-        revised_prob = bayesian_update(base_prob, likelihoods[1], likelihoods[0])
-        if revised_prob > max_prob:
-            max_prob, max_pp = revised_prob, pp
 
-    if max_prob > config.merge_threshold:
-        Agglomerator.do_static_merge(source_p, max_pp)
+def batch_collective_sameness(pairs):
+    """c{collective_sameness} of each of c{pairs}, which have compatible names
+    """
+    if config.batch_scoring and pairs:
+        priors = name_encoder.pairs_prob_same(pairs)
     else:
-        source_p.restore_name()
+        priors = [name_sameness(p1, p2) for p1, p2 in pairs]
+    ret = []
+    for (p1, p2), prior in zip(pairs, priors):
+        (likelihood1, likelihood0) = coauthor_likelihoods(p1, p2)
+        ret.append(bayesian_update(prior, likelihood1, likelihood0))
+    return ret
+
+
+def run_fold_in(candidates, batch_score):
+    """Folds clusters into others under changed names. c{candidates} yields
+    a c{ClusterView} of each source cluster under its changed name, with the
+    clusters it could be merged into; c{batch_score} gives the probability
+    that each of a list of (view, target) pairs is one author. All pairs are
+    scored before any cluster changes. Then each source whose best target
+    scores above the merge threshold is renamed and merged into it, best pairs
+    first, unless either has been merged away by then or the source has been
+    merged into. A target that has been merged into since it was scored may
+    no longer be compatible with the renamed source, which keeps its name.
+    """
+    pairs = []
+    for view, targets in candidates:
+        targets = sorted(targets, key=lambda t: mention_order(t.seed))
+        pairs.extend((view, t) for t in targets)
+    scores = batch_score(pairs)
+
+    best = {}
+    for (view, t), score in zip(pairs, scores):
+        if score > config.merge_threshold and \
+                (view not in best or score > best[view][0]):
+            best[view] = (score, t)
+
+    def merge_order(view):
+        return (-best[view][0], mention_order(view.cluster.seed))
+
+    # clusters merged into this pass, whose names and mentions have changed
+    # since they were scored
+    grown = set()
+    for view in sorted(best, key=merge_order):
+        t = best[view][1]
+        source = view.cluster
+        if source not in Agglomerator.CLUSTERS or t not in Agglomerator.CLUSTERS or \
+                source in grown:
+            continue
+        Agglomerator.rename(source, view.mutation)
+        if t in grown and not utils.compatible_names(source, t):
+            Agglomerator.rename(source, Mention.restore_name)
+            continue
+        Agglomerator.do_static_merge(source, t)
+        grown.add(t)
 
 
-def run_fold_in(mutation, source_criterion, target_criterion, likelihood):
-    token_to_clusters = defaultdict(set)
+def token_candidates(mutation, source_criterion, target_criterion):
+    """Candidates for c{run_fold_in}: the clusters meeting c{source_criterion}
+    under the name c{mutation} gives them, with the compatible clusters of
+    their new token
+    """
     for p in Agglomerator.CLUSTERS:
-        token_to_clusters[p.token()].add(p)
-       
-    for p in Agglomerator.CLUSTERS.copy():
         if not source_criterion(p):
             continue
-        mutation(p)
-        targets = [t for t in token_to_clusters[p.token()]\
-            if t in Agglomerator.CLUSTERS and utils.compatible_names(p, t)\
-            and p != t and target_criterion(p)]
-        attempt_merge(p, targets, likelihood)
+        view = ClusterView(p, mutation)
+        if not target_criterion(view):
+            continue
+        targets = [t for t in Agglomerator.TOKEN_TO_CLUSTERS.get(view.token(), ())
+                   if t is not p and utils.compatible_names(view, t)]
+        yield view, targets
+
+
+def fold_in_score(likelihood):
+    """c{batch_collective_sameness}, revised by the c{likelihood} of the
+    name change
+    """
+    def batch_score(pairs):
+        return [bayesian_update(prob, likelihood[1], likelihood[0])
+                for prob in batch_collective_sameness(pairs)]
+    return batch_score
 
 
 def drop_first_names():
     print "dropping first names"
     run_fold_in(
-        Cluster.drop_first_name, 
-        utils.drop_fn_source_candidate, 
-        utils.drop_fn_target_candidate,
-        config.p_drop_fn)
+        token_candidates(
+            Mention.drop_first_name,
+            utils.drop_fn_source_candidate,
+            utils.drop_fn_target_candidate),
+        fold_in_score(config.p_drop_fn))
 
 
 def drop_hyphenated_last_names():
     print "dropping hyphenated last names"
     run_fold_in(
-        Cluster.drop_hyphenated_ln,
-        utils.drop_ln_source_candidate,
-        lambda x: True,
-        config.p_drop_hyphenated_ln)
+        token_candidates(
+            Mention.drop_hyphenated_ln,
+            utils.drop_ln_source_candidate,
+            lambda x: True),
+        fold_in_score(config.p_drop_hyphenated_ln))
+
+
+def load_variant_index():
+    global variant_index
+    if variant_index is not None:
+        return
+    variant_index = variants.VariantIndex(Agglomerator.CLUSTERS)
+    Agglomerator.LISTENERS.append(variant_index.on_merge)
+    print "  speller loaded"
 
 
-#TODO: implement this method by calling a generalized version of c{run_fold_in}
-def correct_spellings():
-    print "correcting misspellings"
+def spelling_candidates():
+    """Candidates for c{run_fold_in}: clusters whose names are a misspelling
+    away from exactly one other cluster's, the one with fewer mentions as the
+    misspelled source
+    """
+    load_variant_index()
 
-    vocab = defaultdict(int)
-    name_to_parts = defaultdict(set)
+    seen = set()
     for p in Agglomerator.CLUSTERS:
-        for name in p.name_variants():
-            vocab[name] += 1
-            name_to_parts[name].add(p)
-
-    print "  speller loaded"
-
-    sp = speller.Speller(vocab)
-
-    for p in Agglomerator.CLUSTERS.copy():
-        if p not in Agglomerator.CLUSTERS:
-            continue
-        candidates = sp.candidates(p.full_name())
-        p_name = p.full_name()
-        candidates = [c for c in candidates if utils.same_fl_initials(c, p_name)]
-        targets = set()
-        for c in candidates:
-            for p2 in name_to_parts[c]:
-                if p != p2 and p2 in Agglomerator.CLUSTERS:
-                    try:
-                        c_author = Mention()
-                        c_author.load_author_alias(c) #speed up by loading clean name
-                        if utils.compatible_names(p2, c_author):
-                            targets.add(p2)
-                    except MalformedAuthorName, e:
-                        pass
+        targets = variant_index.misspelling_targets(p)
         #TODO: we should consider misspellings with multiple targets
         if len(targets) != 1:
             continue
-   
-        # Now p meets the preliminary criterion for spelling correction.
-        # Next we will evaluate the probabilisticly determine whether to
-        # proceed with the spelling correction.
 
         p2 = min(targets)
 
         (p_wrong, p_right) = (p, p2) \
             if p.num_mentions() < p2.num_mentions() else (p2, p)
 
-        if p_right.shared_articles(p_wrong):
+        if (p_wrong, p_right) in seen or p_right.shared_articles(p_wrong):
             continue
+        seen.add((p_wrong, p_right))
+
+        yield ClusterView(p_wrong, lambda c, p_right=p_right: c.fix_spelling(p_right)), [p_right]
 
+
+def spelling_score(pairs):
+    """The probability that each misspelled view and its target are one
+    author, judged by the names before correction
+    """
+    ret = []
+    for view, p_right in pairs:
+        p_wrong = view.cluster
         prior1 = name_dist.misspelled_prob_same(p_right, p_wrong)
         #TODO: figure out the real likelihood vector
         prior2 = bayesian_update(prior1, config.p_misspelling, 1)
         (likelihood1, likelihood0) = coauthor_likelihoods(p_right, p_wrong)
-        prior3 = bayesian_update(prior2, likelihood1, likelihood0)
-       
-        if prior3 > config.merge_threshold:
-            old_token = p_wrong.token()
-            p_wrong.fix_spelling(p_right)
-            Agglomerator.do_static_merge(p_wrong, p_right)
+        ret.append(bayesian_update(prior2, likelihood1, likelihood0))
+    return ret
+
+
+def correct_spellings():
+    print "correcting misspellings"
+    run_fold_in(spelling_candidates(), spelling_score)
 
 
 if __name__ == "__main__":
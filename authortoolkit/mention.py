@@ -1,29 +1,78 @@
-import re
-from unidecode import unidecode
-import nick_names
+import name_parser
+from name_parser import MalformedAuthorName
 import utils
 
 
-class MalformedAuthorName(Exception):
-    pass
+class ParsedNameCache():
+    """Maps each raw author alias to the (fn, mns, ln, suffix) record parsed
+    from it, so that repeated aliases are parsed once and share one record
+    """
+
+    def __init__(self, max_size=None):
+        self.map = {}
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, name_str, parse):
+        record = self.map.get(name_str)
+        if record is not None:
+            self.hits += 1
+            return record
+
+        self.misses += 1
+        fn, mns, ln, suffix = parse()
+        record = (intern(fn), tuple(intern(mn) for mn in mns), intern(ln), suffix)
+        if self.max_size is None or len(self.map) < self.max_size:
+            self.map[name_str] = record
+        return record
+
+    def clear(self):
+        self.map.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __str__(self):
+        return "%d aliases cached, %d hits, %d misses" % \
+            (len(self.map), self.hits, self.misses)
+
+
+parsed_names = ParsedNameCache()
+
+
+class Mention(object):
+    __slots__ = ("original_name", "merged_name", "first_name", "middle_names",
+                 "last_name", "suffix", "article_id", "author_id",
+                 "former_fn", "former_mns", "former_ln")
 
-class Mention():
     def __init__(self):
         pass
 
+    def __setstate__(self, state):
+        # mentions pickled before __slots__ carry their __dict__, with middle
+        # names as a list; those pickled since carry (None, slot values)
+        if isinstance(state, tuple):
+            state = dict(state[0] or {}, **(state[1] or {}))
+        for k, v in state.iteritems():
+            setattr(self, k, v)
+        if isinstance(state.get("middle_names"), list):
+            self.middle_names = tuple(self.middle_names)
+
     def load_author_alias(self, name_str):
         self.original_name = name_str
         self.merged_name = name_str #this gets overwritten
-        self.first_name, self.middle_names, self.last_name, self.suffix = self.split_name()
+        self.first_name, self.middle_names, self.last_name, self.suffix = \
+            parsed_names.lookup(name_str, self.split_name)
         if len(self.middle_names) > 4:
             msg = "Too many middle names in '%s'" % self
             raise MalformedAuthorName(msg)
 
     def load_clean_name(self, fn, mns, ln, suffix):
+        mns = tuple(mns)
         self.first_name, self.middle_names, self.last_name, self.suffix = \
             (fn, mns, ln, suffix)
 
-        name_str = " ".join([fn] + mns + [ln])
+        name_str = " ".join((fn,) + mns + (ln,))
         self.original_name = name_str
         self.merged_name = name_str #this gets overwritten
 
@@ -46,57 +95,16 @@ class Mention():
         return self.original_name
 
     def clean_name(self):
-        name_str = self.original_name.decode('utf-8')
-        name_str = unidecode(name_str)
-        name_str = re.sub(r'\s+', ' ', name_str)
-        name_str = re.sub(r'[^a-zA-Z .,-]', '', name_str)
-        name_str = re.sub(r' -|- ', ' ', name_str)
-        name_str = re.sub(r'--+', '-', name_str)
-        name_str = re.sub(r'(?i)^(Dr|Mr|Mrs|Ms)\. ', '', name_str)
-        name_str = re.sub('^([A-Z])([A-Z]) ', r'\1. \2. ', name_str)
-        name_str = re.sub('^([A-Z][a-z]+)\. ', r'\1 ', name_str)
-        name_str = re.sub('\. *', ' ', name_str)
-        name_str = re.sub('(:? |^)((van|de|del|da|do|el|la|di|von|der) )+', ' ', name_str)
-        name_str = re.sub(r'^ +| +$', '', name_str)
-        name_str = re.sub(r'\s+', ' ', name_str)
-        return name_str.lower()
+        return name_parser.clean_name(self.original_name)
 
     def split_name(self):
-        cname = self.clean_name()
-
-        suffix = ""
-        m_suffix = re.search(r'(?i)^(.*) (jr|iii|iv)$', cname)
-        if m_suffix:
-            cname, suffix = m_suffix.group(1), m_suffix.group(2)
-
-        not_last_name, last_name = "", ""
-
-        # smith, john c
-        m = re.match('(?P<last>.+), (?P<first>.+)', cname)
-        if not m:
-            # smith j c
-            m = re.match('^(?P<last>\S{2,}) (?P<first>(?:[a-z] )*[a-z])$', cname)
-        if not m:
-            # j c smith
-            m = re.match('^(?P<first>.+?) (?P<last>\S+)$', cname)
-        if not m:
-            msg = "Cannot split '%s' into first and last names" % self
-            raise MalformedAuthorName(msg)
-
-        not_last_name, last_name = m.group("first"), m.group("last")
-
-        name_parts = re.split(r'[ -]+', not_last_name)
-        name_parts = [n for n in name_parts if n]
-        first_name = nick_names.nick_names.get(name_parts[0], name_parts[0])
-        middle_names = name_parts[1:]
+        return name_parser.split_name(self.original_name)
 
-        return first_name, middle_names, last_name, suffix
- 
     def full_name(self):
-        return " ".join([self.first_name] + self.middle_names + [self.last_name])
+        return " ".join((self.first_name,) + self.middle_names + (self.last_name,))
 
     def last_first(self):
-        return " ".join([self.last_name + ","] + [self.first_name] + self.middle_names)
+        return " ".join((self.last_name + ",", self.first_name) + self.middle_names)
 
     def fn(self):
         return self.first_name
@@ -0,0 +1,325 @@
+"""A chunked, columnar on-disk format for mentions.
+
+Mentions are written as a stream of chunks. Each chunk holds a table of the
+distinct strings it uses, stored as one blob plus an offset array, and one
+integer column per mention field indexing into that table. Middle names are
+stored as an offset array into a flat column of string indices.
+
+Mentions are grouped by token block as they are written: they are spread
+over buckets by token, spilled to temporary stores when too many are
+pending, and each bucket is written out sorted by token. A footer records
+where each chunk starts and, for each token block, the chunk rows holding its
+mentions, so readers can load the store chunk by chunk or block by block,
+decoding only the rows of a block.
+"""
+
+import sys, os, struct, shutil, tempfile, zlib
+from array import array
+from cPickle import dump, loads
+from mention import Mention
+
+
+MAGIC = "ATKMS001"
+INDEX_TYPE = "I"
+NO_ID = 0xFFFFFFFF
+CHUNK_HEADER = struct.Struct("<4I")
+TRAILER = struct.Struct("<Q8s")
+
+COLUMNS = ["article_id", "author_id", "original_name", "first_name",
+           "last_name", "suffix"]
+
+
+def is_mention_store(path):
+    handle = open(path, "rb")
+    magic = handle.read(len(MAGIC))
+    handle.close()
+    return magic == MAGIC
+
+
+def _to_bytes(a):
+    if sys.byteorder == "big":
+        a = array(a.typecode, a)
+        a.byteswap()
+    return a.tostring()
+
+
+def _from_bytes(handle, n):
+    a = array(INDEX_TYPE)
+    a.fromstring(handle.read(n * a.itemsize))
+    if sys.byteorder == "big":
+        a.byteswap()
+    return a
+
+
+class MentionStoreWriter():
+    """Writes mentions to c{path}, c{chunk_size} to a chunk. With
+    c{num_buckets}, at most c{chunk_size} mentions are held in memory while
+    adding, and a c{1 / num_buckets} share of them while closing; with
+    c{num_buckets = None}, mentions are written in the order they are added.
+    """
+
+    def __init__(self, path, chunk_size=100000, num_buckets=64):
+        self.path = path
+        self.handle = open(path, "wb")
+        self.handle.write(MAGIC)
+        self.chunk_size = chunk_size
+        self.chunk_offsets = []
+        self.chunk_sizes = []
+        self.token_rows = {}
+        self.num_mentions = 0
+        self.pending = []
+        self.num_buckets = num_buckets
+        if num_buckets:
+            self.buckets = [[] for b in xrange(num_buckets)]
+            self.spills = [None] * num_buckets
+            # stores written by other writers' close_shards, by bucket
+            self.shards = [[] for b in xrange(num_buckets)]
+            self.num_bucketed = 0
+            self.tmp_dir = None
+
+    def add(self, m):
+        if not self.num_buckets:
+            self.pending.append(m)
+            if len(self.pending) >= self.chunk_size:
+                self.flush()
+            return
+
+        bucket = (zlib.crc32(m.token()) & 0xffffffff) % self.num_buckets
+        self.buckets[bucket].append(m)
+        self.num_bucketed += 1
+        if self.num_bucketed >= self.chunk_size:
+            self.spill()
+
+    def add_all(self, mentions):
+        for m in mentions:
+            self.add(m)
+
+    def temp_path(self, name):
+        """A path for c{name} in this writer's temporary directory, which is
+        removed when the writer closes
+        """
+        if self.tmp_dir is None:
+            self.tmp_dir = tempfile.mkdtemp(
+                prefix="mentions", dir=os.path.dirname(os.path.abspath(self.path)))
+        return os.path.join(self.tmp_dir, name)
+
+    def spill(self):
+        """Moves the bucketed mentions to a temporary store per bucket
+        """
+        for b, bucket in enumerate(self.buckets):
+            if not bucket:
+                continue
+            if self.spills[b] is None:
+                path = self.temp_path("bucket%d.%d" % (b, len(self.shards[b])))
+                self.spills[b] = MentionStoreWriter(path, self.chunk_size, None)
+            self.spills[b].add_all(bucket)
+            self.spills[b].flush()
+            self.buckets[b] = []
+        self.num_bucketed = 0
+
+    def add_shards(self, paths):
+        """Adds the mentions of the temporary stores returned by another
+        writer's c{close_shards}, with the same number of buckets. They come
+        after the mentions added before, and the stores are removed on close.
+        """
+        if self.num_bucketed:
+            self.spill()
+        for b, path in enumerate(paths):
+            if path is None:
+                continue
+            if self.spills[b] is not None:
+                self.spills[b].close()
+                self.shards[b].append(self.spills[b].path)
+                self.spills[b] = None
+            self.shards[b].append(path)
+
+    def close_shards(self):
+        """Closes this writer without writing its store, returning the paths
+        of the temporary stores its buckets were spilled to, for another
+        writer's c{add_shards}. They are in that writer's temporary
+        directory if this writer's path is one of its c{temp_path}s.
+        """
+        self.spill()
+        paths = []
+        for spill in self.spills:
+            if spill is not None:
+                spill.close()
+            paths.append(spill and spill.path)
+        self.handle.close()
+        os.remove(self.path)
+        return paths
+
+    def write_buckets(self):
+        """Writes the buckets out one at a time, each sorted by token
+        """
+        for b, bucket in enumerate(self.buckets):
+            if self.spills[b] is not None:
+                self.spills[b].close()
+                self.shards[b].append(self.spills[b].path)
+            stored = []
+            for path in self.shards[b]:
+                reader = MentionStoreReader(path)
+                stored.extend(reader)
+                reader.close()
+            bucket = stored + bucket
+            self.buckets[b] = []
+            bucket.sort(key=Mention.token)
+            for m in bucket:
+                self.pending.append(m)
+                if len(self.pending) >= self.chunk_size:
+                    self.flush()
+        if self.tmp_dir is not None:
+            shutil.rmtree(self.tmp_dir)
+
+    def flush(self):
+        if not self.pending:
+            return
+
+        strings = []
+        string_ids = {}
+
+        def string_id(s):
+            if s is None or s is False:
+                return NO_ID
+            i = string_ids.get(s)
+            if i is None:
+                i = string_ids[s] = len(strings)
+                strings.append(s)
+            return i
+
+        chunk_id = len(self.chunk_offsets)
+        columns = [array(INDEX_TYPE) for c in COLUMNS]
+        mn_offsets = array(INDEX_TYPE, [0])
+        mn_ids = array(INDEX_TYPE)
+        for row, m in enumerate(self.pending):
+            for col, field in zip(columns, COLUMNS):
+                col.append(string_id(getattr(m, field)))
+            mn_ids.extend(string_id(mn) for mn in m.mns())
+            mn_offsets.append(len(mn_ids))
+            # the rows of each token, as (chunk, start, end) ranges
+            rows = self.token_rows.setdefault(m.token(), [])
+            if rows and rows[-1][0] == chunk_id and rows[-1][2] == row:
+                rows[-1] = (chunk_id, rows[-1][1], row + 1)
+            else:
+                rows.append((chunk_id, row, row + 1))
+
+        str_offsets = array(INDEX_TYPE, [0])
+        for s in strings:
+            str_offsets.append(str_offsets[-1] + len(s))
+
+        self.chunk_offsets.append(self.handle.tell())
+        self.chunk_sizes.append(len(self.pending))
+        self.handle.write(CHUNK_HEADER.pack(
+            len(self.pending), len(strings), str_offsets[-1], len(mn_ids)))
+        self.handle.write(_to_bytes(str_offsets))
+        self.handle.write("".join(strings))
+        for col in columns:
+            self.handle.write(_to_bytes(col))
+        self.handle.write(_to_bytes(mn_offsets))
+        self.handle.write(_to_bytes(mn_ids))
+
+        self.num_mentions += len(self.pending)
+        self.pending = []
+
+    def close(self):
+        if self.num_buckets:
+            self.write_buckets()
+        self.flush()
+        footer_offset = self.handle.tell()
+        footer = {
+            "chunk_offsets": self.chunk_offsets,
+            "chunk_sizes": self.chunk_sizes,
+            "token_rows": self.token_rows,
+        }
+        dump(footer, self.handle, 2)
+        self.handle.write(TRAILER.pack(footer_offset, MAGIC))
+        self.handle.close()
+
+
+class MentionStoreReader():
+    def __init__(self, path):
+        self.handle = open(path, "rb")
+        if self.handle.read(len(MAGIC)) != MAGIC:
+            raise ValueError("'%s' is not a mention store" % path)
+        self.handle.seek(-TRAILER.size, 2)
+        trailer_offset = self.handle.tell()
+        footer_offset, magic = TRAILER.unpack(self.handle.read(TRAILER.size))
+        if magic != MAGIC:
+            raise ValueError("'%s' is truncated" % path)
+        self.handle.seek(footer_offset)
+        footer = loads(self.handle.read(trailer_offset - footer_offset))
+        self.chunk_offsets = footer["chunk_offsets"]
+        self.chunk_sizes = footer["chunk_sizes"]
+        if "token_rows" not in footer:
+            raise ValueError("'%s' was written by an older version; "
+                             "re-run pickle_mentions" % path)
+        self.token_rows = footer["token_rows"]
+
+    def __len__(self):
+        return sum(self.chunk_sizes)
+
+    def __iter__(self):
+        for chunk in self.chunks():
+            for m in chunk:
+                yield m
+
+    def num_chunks(self):
+        return len(self.chunk_offsets)
+
+    def chunks(self):
+        for i in xrange(self.num_chunks()):
+            yield self.read_chunk(i)
+
+    def tokens(self):
+        return self.token_rows.keys()
+
+    def block_size(self, token):
+        return sum(end - start for i, start, end in self.token_rows.get(token, ()))
+
+    def read_block(self, token):
+        ret = []
+        for i, start, end in self.token_rows.get(token, ()):
+            ret.extend(self.read_chunk(i, start, end))
+        return ret
+
+    def read_chunk(self, i, start=0, end=None):
+        """The mentions in rows [c{start}, c{end}) of chunk c{i}; only the
+        strings of those rows are decoded
+        """
+        handle = self.handle
+        handle.seek(self.chunk_offsets[i])
+        n, n_strings, blob_len, n_mns = \
+            CHUNK_HEADER.unpack(handle.read(CHUNK_HEADER.size))
+        if end is None:
+            end = n
+        str_offsets = _from_bytes(handle, n_strings + 1)
+        blob = handle.read(blob_len)
+        strings = {NO_ID: False}
+
+        def string(j):
+            s = strings.get(j)
+            if s is None:
+                s = strings[j] = intern(blob[str_offsets[j]:str_offsets[j + 1]])
+            return s
+
+        columns = [_from_bytes(handle, n) for c in COLUMNS]
+        mn_offsets = _from_bytes(handle, n + 1)
+        mn_ids = _from_bytes(handle, n_mns)
+
+        shared_mns = {}
+        ret = []
+        for row in xrange(start, end):
+            m = Mention()
+            for col, field in zip(columns, COLUMNS):
+                setattr(m, field, string(col[row]))
+            key = tuple(mn_ids[mn_offsets[row]:mn_offsets[row + 1]])
+            mns = shared_mns.get(key)
+            if mns is None:
+                mns = shared_mns[key] = tuple(string(j) for j in key)
+            m.middle_names = mns
+            m.merged_name = m.original_name
+            ret.append(m)
+        return ret
+
+    def close(self):
+        self.handle.close()
@@ -1,7 +1,7 @@
-import sys, re
+import sys, re, math, zlib
 from collections import defaultdict
-from mention import Mention
-import config, utils, speller
+import numpy as np
+import config, utils, speller, name_table
 
 
 class Counter():
@@ -13,16 +13,103 @@ class Counter():
         self.map[key] += 1
         self.total += 1
 
+    def count(self, key):
+        return self.map.get(key, 0)
+
     def get_prop(self, key):
-        return (1. + self.map[key]) / (1. + float(self.total))
+        return (1. + self.map.get(key, 0)) / (1. + float(self.total))
+
+    def merge(self, other):
+        for key, count in other.map.iteritems():
+            self.map[key] += count
+        self.total += other.total
+
+    def piece(self):
+        return self.map
+
+    def vocabulary(self):
+        """The names counted so far, which spellers draw candidates from"""
+        return self.map
+
+
+class SketchCounter(Counter):
+    """A c{Counter} whose memory does not grow with the number of distinct
+    names. Names are counted in a count-min sketch until their estimated
+    count reaches c{heavy_count}; from then on they are also counted exactly,
+    in c{map}. A count is overestimated by at most c{epsilon} times the total,
+    except with probability c{delta}, and is never underestimated. The names
+    themselves are all kept, without counts, in c{names}: rare names are the
+    likely misspellings, so the spellers need every one of them.
+    """
+
+    def __init__(self, epsilon=None, delta=None, heavy_count=None):
+        if epsilon is None:
+            epsilon = config.sketch_epsilon
+        if delta is None:
+            delta = config.sketch_delta
+        if heavy_count is None:
+            heavy_count = config.sketch_heavy_count
+        self.map = {}
+        self.names = set()
+        self.total = 0
+        self.heavy_count = heavy_count
+        self.width = int(math.ceil(math.e / epsilon))
+        depth = int(math.ceil(math.log(1. / delta)))
+        self.rows = np.arange(depth)
+        self.table = np.zeros((depth, self.width), dtype=np.int32)
+
+    def columns(self, key):
+        # double hashing: row i uses h1 + i * h2
+        h1 = zlib.crc32(key) & 0xffffffff
+        h2 = (zlib.adler32(key) & 0xffffffff) | 1
+        return (h1 + self.rows * h2) % self.width
+
+    def estimate(self, key):
+        return int(self.table[self.rows, self.columns(key)].min())
+
+    def incr(self, key):
+        self.total += 1
+        self.names.add(key)
+        if key in self.map:
+            self.map[key] += 1
+            return
+        cols = self.columns(key)
+        self.table[self.rows, cols] += 1
+        if self.table[self.rows, cols].min() >= self.heavy_count:
+            self.map[key] = 0
+
+    def count(self, key):
+        return self.estimate(key) + self.map.get(key, 0)
+
+    def get_prop(self, key):
+        return (1. + self.count(key)) / (1. + float(self.total))
+
+    def merge(self, other):
+        if self.table.shape != other.table.shape:
+            raise ValueError("cannot merge sketches of different sizes")
+        self.table += other.table
+        for key, count in other.map.iteritems():
+            self.map[key] = self.map.get(key, 0) + count
+        self.names |= other.names
+        self.total += other.total
+
+    def piece(self):
+        return self
+
+    def vocabulary(self):
+        return self.names
 
 
 class PriorNameDist():
     """Evaluates the mutual information between two authors, given a training dataset"""
 
-    def __init__(self):
-        self.fn_map, self.fl_map, self.ln_map = Counter(), Counter(), Counter()
-        self.cache = {}
+    def __init__(self, make_counter=Counter):
+        self.fn_map, self.fl_map, self.ln_map = \
+            make_counter(), make_counter(), make_counter()
+        # shared by c{prob_same} and c{common_prob_gen}, keyed by name tuples
+        self.cache = utils.LRUCache(config.score_cache_size)
+        # precomputed neighborhood masses, see c{neighborhood_prop}
+        self.masses = {}
 
     def add_mention(self, r):
         self.fl_map.incr(r.fn()[0])
@@ -34,19 +121,100 @@ class PriorNameDist():
                 self.fn_map.incr(m)
         self.ln_map.incr(r.ln())
 
+    def merge(self, other):
+        """Adds the counts of another c{PriorNameDist}, e.g. one built from a
+        different shard of the training data
+        """
+        self.fn_map.merge(other.fn_map)
+        self.fl_map.merge(other.fl_map)
+        self.ln_map.merge(other.ln_map)
+
     def load_pieces(self, pieces):
+        """Loads counts from a dict of pickled count dicts or
+        c{SketchCounter}s, or of the c{name_table.MappedTable}s read from a
+        table file
+        """
         def piece_to_counter(piece):
+            if isinstance(piece, SketchCounter):
+                return piece
             ret = Counter()
             ret.map = piece
-            ret.total = reduce(lambda x,y: x + y, piece.values())
+            if isinstance(piece, name_table.MappedTable):
+                ret.total = piece.total
+            else:
+                ret.total = sum(piece.itervalues())
             return ret
 
         self.fn_map = piece_to_counter(pieces['fn'])
         self.fl_map = piece_to_counter(pieces['fl'])
         self.ln_map = piece_to_counter(pieces['ln'])
 
-        self.fn_sp = speller.Speller(set(self.fn_map.map.keys()))
-        self.ln_sp = speller.Speller(set(self.ln_map.map.keys()))
+        self.load_spellers()
+        self.masses = dict((kind, pieces[kind]) for kind in self.NEIGHBORHOODS
+                           if kind in pieces)
+
+    def load_spellers(self):
+        self.fn_sp = speller.DeletionSpeller(self.fn_map.vocabulary())
+        self.ln_sp = speller.DeletionSpeller(self.ln_map.vocabulary())
+
+    def pieces(self):
+        """Returns the counts, and any precomputed neighborhood masses, in the
+        form taken by c{load_pieces}
+        """
+        ret = {"fn": self.fn_map.piece(), "fl": self.fl_map.piece(),
+               "ln": self.ln_map.piece()}
+        ret.update(self.masses)
+        return ret
+
+    def table_pieces(self):
+        """Returns the counts, and any precomputed neighborhood masses, in the
+        form taken by c{name_table.write_tables}
+        """
+        if isinstance(self.ln_map, SketchCounter):
+            raise ValueError("approximate counts cannot be written as name tables")
+        ret = dict((name, (counter.map, "q", counter.total)) for name, counter in
+                   [("fn", self.fn_map), ("fl", self.fl_map), ("ln", self.ln_map)])
+        for kind, masses in self.masses.iteritems():
+            ret[kind] = (masses, "d", 0.)
+        return ret
+
+    # the neighborhoods used to score misspellings: the counter and speller
+    # they are drawn from, and whether they only contain names sharing the
+    # misspelled name's initial
+    NEIGHBORHOODS = {
+        "fn_mass": ("fn_map", "fn_sp", True),
+        "mn_mass": ("fn_map", "fn_sp", False),
+        "ln_mass": ("ln_map", "ln_sp", True),
+    }
+
+    def neighborhood_prop(self, kind, name):
+        """The total probability of c{name} and of the known names one edit
+        away from it, which the name could be a misspelling of
+        """
+        masses = self.masses.get(kind)
+        if masses is not None and name in masses:
+            return masses[name]
+
+        counter_name, speller_name, same_initial = self.NEIGHBORHOODS[kind]
+        counter = getattr(self, counter_name)
+        sp = getattr(self, speller_name)
+        neighborhood = set([name] + sp.candidates(name))
+        if same_initial:
+            neighborhood = [c for c in neighborhood if c[0] == name[0]]
+        return sum([counter.get_prop(c) for c in neighborhood])
+
+    def precompute_neighborhoods(self):
+        """Computes c{neighborhood_prop} for every known name longer than an
+        initial, so that scoring a misspelling takes a lookup per name part
+        """
+        self.load_spellers()
+        masses = {}
+        for kind, (counter_name, speller_name, same_initial) in \
+                self.NEIGHBORHOODS.iteritems():
+            names = getattr(self, counter_name).vocabulary()
+            masses[kind] = dict((name, self.neighborhood_prop(kind, name))
+                                for name in names if len(name) > 1)
+        self.masses = masses
 
     def prob_gen(self, fn, mns, ln):
         f_map = self.fn_map if len(fn) > 1 else self.fl_map
@@ -62,34 +230,38 @@ class PriorNameDist():
 
     def common_prob_gen(self, p1, p2):
         fn = utils.shorter(p1.fn(), p2.fn())
-        mns = []
+        mns = ()
         mns1, mns2 = p1.mns(), p2.mns()
         if len(mns1) == len(mns2):
-            mns = [utils.shorter(mns1[mi], mns2[mi]) for mi in xrange(len(mns1))]
+            mns = tuple(utils.shorter(mns1[mi], mns2[mi]) for mi in xrange(len(mns1)))
 
-        return self.prob_gen(fn, mns, p1.ln())
+        cache_key = (fn, mns, p1.ln())
+        ret = self.cache.get(cache_key)
+        if ret is None:
+            ret = self.prob_gen(fn, mns, p1.ln())
+            self.cache.put(cache_key, ret)
+        return ret
 
     def prob_same(self, p1, p2):
-        if not utils.compatible_names(p1, p2):
-            return 0.
-
-        cache_key = "%s|%s" % (p1.full_name(), p2.full_name())
-        if cache_key in self.cache:
-            return self.cache[cache_key]
-
-        iname = Mention(p1, p2)
-        gen_prob2 = self.prob_gen(iname.fn(), iname.mns(), iname.ln())
-        gen_prob = self.common_prob_gen(p1, p2)
+        name1 = (p1.fn(), p1.mns(), p1.ln())
+        name2 = (p2.fn(), p2.mns(), p2.ln())
+        cache_key = (name1, name2) if name1 < name2 else (name2, name1)
+        prob_same = self.cache.get(cache_key)
+        if prob_same is not None:
+            return prob_same
 
-        print "should be the same:", gen_prob, gen_prob2        
+        if not utils.compatible_names(p1, p2):
+            prob_same = 0.
+        else:
+            gen_prob = self.common_prob_gen(p1, p2)
 
-        # c{expected_others} is the expected number of other authors sharing this name
-        expected_others = config.expected_authors * gen_prob
-        # c{prob_same} is the probability that both references were generated 
-        # by the same authors
-        prob_same = 1. / (1. + expected_others)
+            # c{expected_others} is the expected number of other authors sharing this name
+            expected_others = config.expected_authors * gen_prob
+            # c{prob_same} is the probability that both references were generated 
+            # by the same authors
+            prob_same = 1. / (1. + expected_others)
 
-        self.cache[cache_key] = prob_same
+        self.cache.put(cache_key, prob_same)
         return prob_same
 
     def misspelled_common_prob_gen(self, p_right, p_wrong):
@@ -105,9 +277,7 @@ class PriorNameDist():
             ret *= f_map.get_prop(fn_intersection)
         else:
             if len(p_right.fn()) != 1:
-                neighborhood = set([p_right.fn()] + self.fn_sp.candidates(p_right.fn()))
-                neighborhood = [c for c in neighborhood if c[0] == p_right.fn()[0]]
-                ret *= sum([self.fn_map.get_prop(c) for c in neighborhood])
+                ret *= self.neighborhood_prop("fn_mass", p_right.fn())
     
         for rw, ww in mns_pairs:
             if utils.compatible_name_part(rw, ww):
@@ -117,16 +287,13 @@ class PriorNameDist():
             else:
                 if len(rw) != 1: #an initial can be mutated into any initial
                     #TODO: watch out for 2-character names, that could be changed to initials
-                    neighborhood = set([rw] + self.fn_sp.candidates(rw))
-                    ret *= sum([self.fn_map.get_prop(c) for c in neighborhood])
+                    ret *= self.neighborhood_prop("mn_mass", rw)
         
         r_ln, w_ln = p_right.ln(), p_wrong.ln()
         if r_ln == w_ln:
             ret *= self.ln_map.get_prop(r_ln)
         else:
-            neighborhood = set([r_ln] + self.ln_sp.candidates(r_ln))
-            neighborhood = [c for c in neighborhood if c[0] == r_ln[0]]
-            ret *= sum([self.ln_map.get_prop(c) for c in neighborhood])
+            ret *= self.neighborhood_prop("ln_mass", r_ln)
 
         return ret
 
@@ -0,0 +1,174 @@
+import string
+from unidecode import unidecode
+import nick_names
+
+
+class MalformedAuthorName(Exception):
+    pass
+
+
+WHITESPACE = frozenset(" \t\n\r\x0b\x0c")
+KEPT_CHARS = frozenset(string.ascii_letters + " .,-")
+UPPERCASE = frozenset(string.ascii_uppercase)
+LOWERCASE = frozenset(string.ascii_lowercase)
+SEPARATORS = frozenset(" .")
+
+TITLES = frozenset(["dr", "mr", "mrs", "ms"])
+PARTICLES = frozenset(["van", "de", "del", "da", "do", "el", "la", "di", "von", "der"])
+SUFFIXES = frozenset(["jr", "iii", "iv"])
+NICK_NAMES = nick_names.nick_names
+
+
+def to_ascii(name_str):
+    u_name = name_str.decode('utf-8')
+    try:
+        return u_name.encode('ascii')
+    except UnicodeEncodeError:
+        return unidecode(u_name)
+
+
+def tokenize(name_str):
+    """Splits an alias into the tokens of its normalized form in a single
+    left-to-right pass over its characters.
+
+    Whitespace runs are collapsed, disallowed characters dropped, hyphens next
+    to spaces and repeated hyphens removed, and the result is split on spaces
+    and periods. Returns the first few characters of the normalized string
+    along with (token, start, separator) triples, where c{separator} is the
+    character ending the token, or "" at the end of the string.
+    """
+    tokens = []
+    head = []
+    token = []
+    start = 0
+    pos = 0
+    prev_ws = False
+    pending = None
+    prev_hyphen = False
+
+    for c in to_ascii(name_str) + "\0":
+        if c in WHITESPACE:
+            if prev_ws:
+                continue
+            prev_ws = True
+            c = " "
+        else:
+            prev_ws = False
+        if c not in KEPT_CHARS:
+            if c != "\0":
+                continue
+            c = ""
+
+        # " -" and "- " become " ", scanning left to right without overlaps
+        if pending is not None and pending + c in (" -", "- "):
+            emit, pending = " ", None
+        else:
+            emit = pending or ""
+            if c in (" ", "-"):
+                pending = c
+            else:
+                emit, pending = emit + c, None
+
+        for e in emit:
+            if e == "-":
+                if prev_hyphen:
+                    continue
+                prev_hyphen = True
+            else:
+                prev_hyphen = False
+
+            if len(head) < 8:
+                head.append(e)
+            if e in SEPARATORS:
+                if token:
+                    tokens.append(("".join(token), start, e))
+                    token = []
+            else:
+                if not token:
+                    start = pos
+                token.append(e)
+            pos += 1
+
+    if token:
+        tokens.append(("".join(token), start, ""))
+    return "".join(head), tokens
+
+
+def clean_tokens(name_str):
+    """Returns the lowercased tokens of the cleaned alias, after dropping a
+    leading title and any name particles
+    """
+    head, tokens = tokenize(name_str)
+
+    # a leading "Dr. ", "Mr. ", "Mrs. " or "Ms. "
+    title_len = 0
+    dot = head.find(".")
+    if 2 <= dot <= 3 and head[dot + 1:dot + 2] == " " and head[:dot].lower() in TITLES:
+        title_len = dot + 2
+
+    ret = []
+    for t, start, sep in tokens:
+        if start < title_len:
+            continue
+        if start == title_len and len(t) == 2 and sep == " " and \
+                t[0] in UPPERCASE and t[1] in UPPERCASE:
+            # "JC Smith" is read as "J. C. Smith"
+            ret.append(t[0].lower())
+            ret.append(t[1].lower())
+        elif sep and t in PARTICLES:
+            continue
+        else:
+            ret.append(t.lower())
+    return ret
+
+
+def clean_name(name_str):
+    return " ".join(clean_tokens(name_str))
+
+
+def split_name(name_str):
+    toks = clean_tokens(name_str)
+
+    suffix = ""
+    if len(toks) > 1 and toks[-1] in SUFFIXES:
+        suffix = toks.pop()
+
+    first_toks, last_name = None, None
+    # smith, john c
+    for k in xrange(len(toks) - 2, -1, -1):
+        if toks[k][-1] == "," and (k > 0 or len(toks[k]) > 1):
+            last_name = " ".join(toks[:k + 1])[:-1]
+            first_toks = toks[k + 1:]
+            break
+    # smith j c
+    if first_toks is None and len(toks) > 1 and len(toks[0]) > 1:
+        if all(len(t) == 1 and t in LOWERCASE for t in toks[1:]):
+            last_name, first_toks = toks[0], toks[1:]
+    # j c smith
+    if first_toks is None and len(toks) > 1:
+        last_name, first_toks = toks[-1], toks[:-1]
+    if first_toks is None:
+        msg = "Cannot split '%s' into first and last names" % name_str
+        raise MalformedAuthorName(msg)
+
+    name_parts = [n for t in first_toks for n in t.split("-") if n]
+    first_name = NICK_NAMES.get(name_parts[0], name_parts[0])
+    middle_names = name_parts[1:]
+
+    return first_name, middle_names, last_name, suffix
+
+
+def split_names(name_strs):
+    """Parses a batch of aliases, returning a list with a (fn, mns, ln, suffix)
+    record, or None for aliases that cannot be parsed, in the input order
+    """
+    parsed = {}
+    ret = []
+    for name_str in name_strs:
+        if name_str not in parsed:
+            try:
+                parsed[name_str] = split_name(name_str)
+            except (MalformedAuthorName, ValueError):
+                parsed[name_str] = None
+        ret.append(parsed[name_str])
+    return ret
@@ -0,0 +1,145 @@
+"""Memory-mapped, sorted string tables for the name prior.
+
+A table file holds several named tables. Each table stores its keys sorted,
+as one blob plus an array of offsets, along with an array of values (counts or
+floats) and the table's total. Tables are read through c{mmap} and searched by
+bisection, so opening a file costs a few reads however large it is, and worker
+processes share one page-cached copy.
+"""
+
+import mmap, struct
+
+
+MAGIC = "ATKNT001"
+HEADER = struct.Struct("<8sI")
+ENTRY = struct.Struct("<16scxxxxxxxQdQQQ")
+OFFSET = struct.Struct("<Q")
+VALUE_FORMATS = {"q": struct.Struct("<q"), "d": struct.Struct("<d")}
+
+
+def is_table_file(path):
+    handle = open(path, "rb")
+    magic = handle.read(len(MAGIC))
+    handle.close()
+    return magic == MAGIC
+
+
+def write_tables(path, tables):
+    """Writes c{tables}, a dict from table name to (mapping, typecode, total),
+    where typecode is "q" for integer values and "d" for floats
+    """
+    handle = open(path, "wb")
+    names = sorted(tables)
+    handle.write(HEADER.pack(MAGIC, len(names)))
+    directory_pos = handle.tell()
+    handle.write("\0" * (ENTRY.size * len(names)))
+
+    entries = []
+    for name in names:
+        mapping, typecode, total = tables[name]
+        value_format = VALUE_FORMATS[typecode]
+        keys = sorted(mapping)
+
+        offsets_pos = handle.tell()
+        offset = 0
+        handle.write(OFFSET.pack(offset))
+        for k in keys:
+            offset += len(k)
+            handle.write(OFFSET.pack(offset))
+
+        values_pos = handle.tell()
+        for k in keys:
+            handle.write(value_format.pack(mapping[k]))
+
+        blob_pos = handle.tell()
+        for k in keys:
+            handle.write(k)
+
+        entries.append(ENTRY.pack(name, typecode, len(keys), total,
+                                  offsets_pos, values_pos, blob_pos))
+
+    handle.seek(directory_pos)
+    handle.write("".join(entries))
+    handle.close()
+
+
+def open_tables(path):
+    """Maps the table file at c{path}, returning a dict from table name to
+    c{MappedTable}
+    """
+    handle = open(path, "rb")
+    buf = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    handle.close()
+
+    magic, num_tables = HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ValueError("'%s' is not a name table file" % path)
+
+    ret = {}
+    for i in xrange(num_tables):
+        name, typecode, n, total, offsets_pos, values_pos, blob_pos = \
+            ENTRY.unpack_from(buf, HEADER.size + i * ENTRY.size)
+        name = name.rstrip("\0")
+        ret[name] = MappedTable(buf, typecode, n, total,
+                                offsets_pos, values_pos, blob_pos)
+    return ret
+
+
+class MappedTable():
+    """A read-only mapping from strings to values. Missing keys map to zero,
+    as in the c{defaultdict(int)} counts it replaces, but are not inserted.
+    """
+
+    def __init__(self, buf, typecode, n, total, offsets_pos, values_pos, blob_pos):
+        self.buf = buf
+        self.value_format = VALUE_FORMATS[typecode]
+        self.n = n
+        self.total = total
+        self.offsets_pos = offsets_pos
+        self.values_pos = values_pos
+        self.blob_pos = blob_pos
+
+    def __len__(self):
+        return self.n
+
+    def key(self, i):
+        start = OFFSET.unpack_from(self.buf, self.offsets_pos + i * OFFSET.size)[0]
+        end = OFFSET.unpack_from(self.buf, self.offsets_pos + (i + 1) * OFFSET.size)[0]
+        return self.buf[self.blob_pos + start:self.blob_pos + end]
+
+    def value(self, i):
+        pos = self.values_pos + i * self.value_format.size
+        return self.value_format.unpack_from(self.buf, pos)[0]
+
+    def find(self, key):
+        lo, hi = 0, self.n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.n and self.key(lo) == key:
+            return lo
+        return -1
+
+    def get(self, key, default=0):
+        i = self.find(key)
+        return self.value(i) if i >= 0 else default
+
+    def __getitem__(self, key):
+        return self.get(key)
+
+    def __contains__(self, key):
+        return self.find(key) >= 0
+
+    def __iter__(self):
+        for i in xrange(self.n):
+            yield self.key(i)
+
+    def keys(self):
+        return list(self)
+
+    def iteritems(self):
+        for i in xrange(self.n):
+            yield self.key(i), self.value(i)
@@ -1,19 +1,25 @@
 #!/usr/bin/python -u
 
-import sys, re
-from cPickle import dump
+import os, re, argparse
 from collections import defaultdict
-from mention import Mention, MalformedAuthorName
+from multiprocessing import Pool
+from mention import Mention, MalformedAuthorName, parsed_names
+from mention_store import MentionStoreWriter
+import utils
 
 
 mentions = set()
 
+# the byte ranges handed to the workers are at most this long, so that the
+# work is spread evenly
+max_range_bytes = 64 * 1024 * 1024
 
-def load_mentions(in_file):
-    print "loading mentions"
 
-    names_handle = open(in_file)
-    for n in names_handle:
+def iter_mentions(in_file, start=0, end=None, errors=None):
+    """Yields the mentions on the lines starting in [c{start}, c{end}). Bad
+    lines are tallied in c{errors} if it is given, and printed otherwise.
+    """
+    for n in utils.read_lines(in_file, start, end):
         try:
             vals = n.rstrip().split("\t")
             if len(vals) == 2: #for prediction mode
@@ -22,21 +28,89 @@ def load_mentions(in_file):
             try:
                 m = Mention()
                 m.load_author_alias(author_alias)
-                m.article_id = article_id
-                m.author_id = author_id
+                m.article_id = intern(article_id)
+                m.author_id = intern(author_id) if author_id else author_id
 
-                mentions.add(m)
+                yield m
             except MalformedAuthorName, e:
-                print e
+                if errors is None:
+                    print e
+                else:
+                    errors["malformed names"] += 1
         except ValueError, e:
-            print "Cannot split line '%s'" % n.rstrip()
+            if errors is None:
+                print "Cannot split line '%s'" % n.rstrip()
+            else:
+                errors["unsplittable lines"] += 1
 
 
-if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print "usage: %s <names_in_file>" % sys.argv[0]
+def store_range(args):
+    """Parses the lines in a byte range into temporary stores by bucket,
+    returning their paths
+    """
+    in_file, start, end, path, chunk_size, num_buckets = args
+    errors = defaultdict(int)
+    writer = MentionStoreWriter(path, chunk_size, num_buckets)
+    writer.add_all(iter_mentions(in_file, start, end, errors))
+    return os.getpid(), writer.close_shards(), dict(errors)
+
+
+def store_mentions_parallel(in_file, writer, workers):
+    """Parses byte ranges of c{in_file} in a pool of c{workers} processes.
+    Each worker spills the mentions of its range to temporary stores by
+    bucket, which c{writer} adds in file order; mentions are not sent
+    between processes.
+    """
+    num_ranges = max(workers * 4, os.path.getsize(in_file) / max_range_bytes + 1)
+    ranges = [(in_file, start, end, writer.temp_path("range%d" % k),
+               writer.chunk_size, writer.num_buckets)
+              for k, (start, end) in enumerate(utils.line_ranges(in_file, num_ranges))]
+
+    worker_errors = defaultdict(lambda: defaultdict(int))
+    pool = Pool(workers)
+    try:
+        for pid, shards, errors in pool.imap(store_range, ranges):
+            for k, v in errors.iteritems():
+                worker_errors[pid][k] += v
+            writer.add_shards(shards)
+    finally:
+        pool.terminate()
+        pool.join()
+
+    for pid in sorted(worker_errors):
+        counts = worker_errors[pid]
+        print "  worker %d: %s" % (pid, ", ".join(
+            "%d %s" % (counts[k], k) for k in sorted(counts)))
+
+
+def load_mentions(in_file):
+    print "loading mentions"
+    for m in iter_mentions(in_file):
+        mentions.add(m)
+    print "  parsed names: %s" % parsed_names
+
+
+def store_mentions(in_file, out_file, workers=1):
+    print "storing mentions"
+    writer = MentionStoreWriter(out_file)
+    if workers > 1:
+        store_mentions_parallel(in_file, writer, workers)
     else:
-        load_mentions(sys.argv[1])
-        pickle_handle = open("%s.pickled" % sys.argv[1], "w")
-        dump(mentions, pickle_handle, 2)
+        writer.add_all(iter_mentions(in_file))
+        print "  parsed names: %s" % parsed_names
+    writer.close()
+    print "  stored %d mentions" % writer.num_mentions
+
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Parses tab-separated (article id, author name[, author id]) "
+                    "lines into a mention store, <names_in_file>.mentions, for "
+                    "disambiguate.py. Stores replace the <names_in_file>.pickled "
+                    "files of earlier versions, which disambiguate.py still reads.")
+    parser.add_argument("--workers", type=int, default=1,
+        help="number of processes parsing the input in parallel")
+    parser.add_argument("names_in_file")
+    args = parser.parse_args()
+    store_mentions(args.names_in_file, "%s.mentions" % args.names_in_file,
+        args.workers)
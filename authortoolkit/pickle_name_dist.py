@@ -1,39 +1,143 @@
 #!/usr/bin/python
 
-import sys, re, pickle
+import re, pickle, argparse
 from collections import defaultdict
-import mention
-from name_dist import PriorNameDist
+from multiprocessing import Pool
+from mention import Mention
+from name_dist import PriorNameDist, Counter, SketchCounter
+import name_table
+import config
+import utils
 
 
-def run(in_file, out_file):
-    in_handle = open(in_file)
-    out_handle = open(out_file, "w")
-
-    pnd = PriorNameDist()
+def build_range(args):
+    """Builds a c{PriorNameDist} from the lines starting in a byte range of
+    the input, also returning how many lines were skipped for each reason
+    """
+    in_file, start, end, verbose, make_counter = args
+    pnd = PriorNameDist(make_counter)
+    skipped = defaultdict(int)
 
     i = 0
-    for line in in_handle:
+    for line in utils.read_lines(in_file, start, end):
         try:
-            m = mention.Mention(line.rstrip())
+            m = Mention()
+            m.load_author_alias(line.rstrip())
             pnd.add_mention(m)
             i += 1
-            if (i % 10000) == 0:
+            if verbose and (i % 10000) == 0:
                 print "loaded author %d" % i
-        except:
-            pass
+        except Exception, e:
+            skipped[type(e).__name__] += 1
 
-    pnd_dump = {
-        "fn": pnd.fn_map.map,
-        "fl": pnd.fl_map.map,
-        "ln": pnd.ln_map.map,
-    }
-        
-    pickle.dump(pnd_dump, out_handle, 2)
+    return pnd, dict(skipped)
 
 
-if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print "usage: %s <names_txt_in> <name_dat_out>" % sys.argv[0]
+def build(in_file, workers=1, make_counter=Counter):
+    if workers > 1:
+        ranges = [(in_file, start, end, False, make_counter)
+                  for start, end in utils.line_ranges(in_file, workers * 4)]
+        pool = Pool(workers)
+        parts = pool.imap_unordered(build_range, ranges)
     else:
-        run(sys.argv[1], sys.argv[2])
+        parts = [build_range((in_file, 0, None, True, make_counter))]
+
+    pnd = PriorNameDist(make_counter)
+    skipped = defaultdict(int)
+    for part_pnd, part_skipped in parts:
+        pnd.merge(part_pnd)
+        for reason, count in part_skipped.iteritems():
+            skipped[reason] += count
+
+    if workers > 1:
+        pool.close()
+        pool.join()
+
+    for reason in sorted(skipped):
+        print "skipped %d lines (%s)" % (skipped[reason], reason)
+    return pnd
+
+
+def report(exact, approx, in_file, max_pairs):
+    """Prints how far c{prob_same} under approximate counts is from the exact
+    scores, over up to c{max_pairs} pairs of names that share a token block
+    """
+    blocks = defaultdict(dict)
+    pairs = []
+    for line in utils.read_lines(in_file):
+        m = Mention()
+        try:
+            m.load_author_alias(line.rstrip())
+        except Exception:
+            continue
+        block = blocks[m.token()]
+        if m.full_name() in block:
+            continue
+        for other in block.itervalues():
+            if utils.compatible_names(m, other):
+                pairs.append((m, other))
+        block[m.full_name()] = m
+        if len(pairs) >= max_pairs:
+            break
+    pairs = pairs[:max_pairs]
+
+    errors = [abs(exact.prob_same(p1, p2) - approx.prob_same(p1, p2))
+              for p1, p2 in pairs]
+    if not errors:
+        print "no compatible pairs to compare"
+        return
+    errors.sort()
+    print "prob_same error over %d pairs: mean %g, median %g, 99th percentile %g, max %g" % (
+        len(errors), sum(errors) / len(errors), errors[len(errors) / 2],
+        errors[int(len(errors) * .99)], errors[-1])
+    print "  exactly counted names: %d first, %d first or initial, %d last" % (
+        len(approx.fn_map.map), len(approx.fl_map.map), len(approx.ln_map.map))
+    print "  known names, for misspellings: %d first, %d last" % (
+        len(approx.fn_map.vocabulary()), len(approx.ln_map.vocabulary()))
+
+
+def run(in_file, out_file, workers=1, mapped=False, neighborhoods=False,
+        sketch=False, report_pairs=0):
+    make_counter = SketchCounter if sketch else Counter
+    pnd = build(in_file, workers, make_counter)
+    if sketch and report_pairs:
+        print "building exact counts for comparison"
+        exact = build(in_file, workers)
+        exact.load_spellers()
+        report(exact, pnd, in_file, report_pairs)
+
+    if neighborhoods:
+        print "precomputing misspelling neighborhoods"
+        pnd.precompute_neighborhoods()
+
+    if mapped:
+        name_table.write_tables(out_file, pnd.table_pieces())
+        return
+
+    out_handle = open(out_file, "w")
+    pickle.dump(pnd.pieces(), out_handle, 2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=1,
+        help="number of processes counting names in parallel")
+    parser.add_argument("--mapped", action="store_true",
+        help="write memory-mapped name tables instead of a pickle")
+    parser.add_argument("--neighborhoods", action="store_true",
+        help="precompute the probability mass near each name, for scoring misspellings")
+    parser.add_argument("--sketch", action="store_true",
+        help="count rare names approximately, in less memory (see config.sketch_*)")
+    parser.add_argument("--sketch-epsilon", type=float, metavar="EPS",
+        help="with --sketch, the error bound relative to the total count (default: config.sketch_epsilon)")
+    parser.add_argument("--report", type=int, default=0, metavar="PAIRS",
+        help="with --sketch, compare prob_same against exact counts on this many name pairs")
+    parser.add_argument("names_txt_in")
+    parser.add_argument("name_dat_out")
+    args = parser.parse_args()
+    if args.sketch and args.mapped:
+        parser.error("approximate counts cannot be written as name tables")
+    if args.sketch_epsilon is not None:
+        config.sketch_epsilon = args.sketch_epsilon
+    run(args.names_txt_in, args.name_dat_out, args.workers, args.mapped,
+        args.neighborhoods, args.sketch, args.report)
@@ -30,3 +30,87 @@ class SpaceSpeller(Speller):
         Speller.__init__(self, vocabulary)
         self.alphabet += ' '
 
+
+
+class DeletionSpeller(Speller):
+    """Finds known words near a word by symmetric deletion: the vocabulary is
+    indexed under every string reachable from each word by up to
+    c{max_distance} deletions, and a word's own deletions are looked up in
+    that index, so replacements and insertions are never generated
+    """
+
+    def __init__(self, vocabulary, max_distance=1):
+        Speller.__init__(self, vocabulary)
+        self.max_distance = max_distance
+        self.index = None
+
+    def deletes(self, word, distance):
+        ret = set([word])
+        frontier = ret
+        for d in xrange(distance):
+            frontier = set(w[:i] + w[i + 1:] for w in frontier for i in xrange(len(w)))
+            frontier -= ret
+            ret |= frontier
+        return ret
+
+    def build_index(self):
+        self.index = {}
+        for w in self.nwords:
+            self.add_to_index(w)
+
+    def add_to_index(self, word):
+        for d in self.deletes(word, self.max_distance):
+            self.index.setdefault(d, []).append(word)
+
+    def within_one_edit(self, word, c):
+        """Whether c{c} is in c{self.edits1(word)}: one deletion, transposition,
+        or replacement or insertion of a letter of the alphabet away
+        """
+        lw, lc = len(word), len(c)
+        i = 0
+        while i < lw and i < lc and word[i] == c[i]:
+            i += 1
+        if lc == lw - 1:
+            return word[i + 1:] == c[i:]
+        if lc == lw + 1:
+            return c[i] in self.alphabet and word[i:] == c[i + 1:]
+        if lc != lw or i == lw:
+            return False
+        if word[i + 1:] == c[i + 1:]:
+            return c[i] in self.alphabet
+        return i + 1 < lw and word[i] == c[i + 1] and word[i + 1] == c[i] and \
+            word[i + 2:] == c[i + 2:]
+
+    def within(self, word, c, distance):
+        if distance == 1:
+            return self.within_one_edit(word, c)
+        return osa_distance(word, c) <= distance
+
+    def candidates(self, word, distance=1):
+        if distance > self.max_distance:
+            msg = "speller is indexed for distance %d" % self.max_distance
+            raise ValueError(msg)
+        if self.index is None:
+            self.build_index()
+
+        found = set()
+        for d in self.deletes(word, distance):
+            found.update(self.index.get(d, ()))
+        return [c for c in found if c != word and self.within(word, c, distance)]
+
+
+def osa_distance(w1, w2):
+    """The optimal string alignment distance: the number of deletions,
+    insertions, replacements and adjacent transpositions turning w1 into w2,
+    where no substring is edited twice
+    """
+    prev2, prev = None, range(len(w2) + 1)
+    for i in xrange(1, len(w1) + 1):
+        cur = [i] + [0] * len(w2)
+        for j in xrange(1, len(w2) + 1):
+            cost = 0 if w1[i - 1] == w2[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and w1[i - 1] == w2[j - 2] and w1[i - 2] == w2[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        prev2, prev = prev, cur
+    return prev[len(w2)]
@@ -1,4 +1,4 @@
-import re
+import os, re
 from collections import defaultdict
 
 
@@ -66,3 +66,181 @@ def same_fl_initials(name1, name2):
     li2 = re_ss.sub(r'\1', name2)
     return li1 == li2
 
+
+
+def line_ranges(path, num_ranges):
+    """Splits the file at c{path} into at most c{num_ranges} byte ranges
+    that start and end on line boundaries
+    """
+    size = os.path.getsize(path)
+    handle = open(path, "rb")
+    bounds = [0]
+    for i in xrange(1, num_ranges):
+        handle.seek(max(size * i / num_ranges - 1, bounds[-1]))
+        handle.readline()
+        pos = min(handle.tell(), size)
+        if pos > bounds[-1]:
+            bounds.append(pos)
+    handle.close()
+    if size > bounds[-1]:
+        bounds.append(size)
+    return zip(bounds[:-1], bounds[1:])
+
+
+def read_lines(path, start=0, end=None):
+    """Yields the lines of c{path} that start within the byte range
+    [c{start}, c{end})
+    """
+    handle = open(path, "rb")
+    handle.seek(start)
+    pos = start
+    while end is None or pos < end:
+        line = handle.readline()
+        if not line:
+            break
+        pos += len(line)
+        yield line
+    handle.close()
+
+
+def size_histogram(sizes):
+    """Summarizes c{sizes} as counts in power-of-two buckets
+    """
+    buckets = defaultdict(int)
+    for size in sizes:
+        low = 1
+        while low * 2 <= size:
+            low *= 2
+        buckets[low] += 1
+    if not sizes:
+        return "none"
+    return "%s (largest %d)" % (", ".join("%d-%d: %d" % (low, 2 * low - 1, buckets[low])
+                                          for low in sorted(buckets)), max(sizes))
+
+
+class LRUCache():
+    """A dict bounded to c{max_size} entries (unbounded if None), evicting
+    the least recently used entry first
+    """
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size
+        self.clear()
+
+    def __len__(self):
+        return len(self.map)
+
+    def get(self, key, default=None):
+        link = self.map.get(key)
+        if link is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        if self.max_size is not None:
+            # move the entry to the most recently used end of the list
+            prev, next = link[0], link[1]
+            prev[1], next[0] = next, prev
+            root = self.root
+            last = root[0]
+            last[1] = root[0] = link
+            link[0], link[1] = last, root
+        return link[3]
+
+    def put(self, key, value):
+        link = self.map.get(key)
+        if link is not None:
+            link[3] = value
+            return
+        root = self.root
+        last = root[0]
+        link = [last, root, key, value]
+        last[1] = root[0] = self.map[key] = link
+        if self.max_size is not None and len(self.map) > self.max_size:
+            oldest = root[1]
+            root[1], oldest[1][0] = oldest[1], root
+            del self.map[oldest[2]]
+            self.evictions += 1
+
+    def clear(self):
+        self.map = {}
+        # the circular list of [prev, next, key, value] entries, from least
+        # to most recently used
+        self.root = []
+        self.root[:] = [self.root, self.root, None, None]
+        self.hits = self.misses = self.evictions = 0
+
+    def __str__(self):
+        return "%d entries, %d hits, %d misses, %d evictions" % \
+            (len(self.map), self.hits, self.misses, self.evictions)
+
+
+class DisjointSet():
+    """Maps each element to the owner of the set it is in. Sets are joined by
+    c{union} in near-constant time (union by size, with path compression),
+    so that the owner of every element need not be rewritten on a merge.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def __len__(self):
+        return len(self.parents)
+
+    def __contains__(self, x):
+        return x in self.parents
+
+    def __setitem__(self, x, owner):
+        """Puts c{x} in a set of its own, owned by c{owner}
+        """
+        if x in self.parents and \
+                (self.parents[x] is not x or self.sizes[x] != 1):
+            raise ValueError("cannot move an element out of a joined set")
+        self.parents[x] = x
+        self.sizes[x] = 1
+        self.owners[x] = owner
+
+    def find(self, x):
+        root = x
+        parents = self.parents
+        while parents[root] is not root:
+            root = parents[root]
+        while x is not root:
+            parents[x], x = root, parents[x]
+        return root
+
+    def __getitem__(self, x):
+        # paths are compressed, so most elements are roots or their children
+        root = self.parents[x]
+        if self.parents[root] is not root:
+            root = self.find(x)
+        return self.owners[root]
+
+    def get(self, x, default=None):
+        if x not in self.parents:
+            return default
+        return self[x]
+
+    def union(self, x, y, owner):
+        """Joins the sets of c{x} and c{y}, to be owned by c{owner}
+        """
+        root_x, root_y = self.find(x), self.find(y)
+        if root_x is not root_y:
+            if self.sizes[root_x] > self.sizes[root_y]:
+                root_x, root_y = root_y, root_x
+            self.parents[root_x] = root_y
+            self.sizes[root_y] += self.sizes.pop(root_x)
+            del self.owners[root_x]
+        self.owners[root_y] = owner
+
+    def remove_sets(self, elements):
+        """Removes c{elements}, which must make up whole sets
+        """
+        for x in elements:
+            del self.parents[x]
+            self.sizes.pop(x, None)
+            self.owners.pop(x, None)
+
+    def clear(self):
+        self.parents = {}
+        self.sizes = {}
+        self.owners = {}
@@ -0,0 +1,83 @@
+"""The name variants of each cluster, kept up to date as clusters merge.
+
+Each variant string, e.g. "j q smith", maps to the clusters with that variant
+and to the name parsed from it, so that candidate spellings are parsed once.
+The variants are the vocabulary of a c{DeletionSpeller}, whose index grows
+with new variants.
+"""
+
+from mention import Mention, MalformedAuthorName
+import speller
+import utils
+
+
+class VariantIndex():
+    def __init__(self, clusters):
+        self.clusters = {}
+        # the variants each cluster is indexed under, which its name may no
+        # longer give after a rename
+        self.variants = {}
+        self.names = {}
+        # targets of merges, reindexed under their new names on the next lookup
+        self.dirty = set()
+        self.speller = speller.DeletionSpeller(self.clusters)
+        for c in clusters:
+            self.add(c)
+
+    def add(self, c):
+        variants = c.name_variants()
+        self.variants[c] = variants
+        for v in variants:
+            if v not in self.clusters:
+                self.clusters[v] = set()
+                if self.speller.index is not None:
+                    self.speller.add_to_index(v)
+            self.clusters[v].add(c)
+
+    def remove(self, c):
+        for v in self.variants.pop(c, ()):
+            self.clusters[v].discard(c)
+
+    def parsed(self, v):
+        """The name parsed from the variant c{v}, or None if it is malformed
+        """
+        if v not in self.names:
+            try:
+                m = Mention()
+                m.load_author_alias(v)
+                self.names[v] = m
+            except MalformedAuthorName:
+                self.names[v] = None
+        return self.names[v]
+
+    def misspelling_targets(self, p):
+        """The other clusters with a variant a misspelling of the name of
+        c{p} away, with the same initials, and compatible with that variant
+        """
+        for c in self.dirty:
+            if c in self.variants:
+                self.remove(c)
+                self.add(c)
+        self.dirty.clear()
+
+        p_name = p.full_name()
+        targets = set()
+        for v in self.speller.candidates(p_name):
+            if not utils.same_fl_initials(v, p_name):
+                continue
+            name = self.parsed(v)
+            if name is None:
+                continue
+            for p2 in self.clusters[v]:
+                if p2 is not p and utils.compatible_names(p2, name):
+                    targets.add(p2)
+        return targets
+
+    def on_merge(self, c_source, c_target):
+        """Called by c{Agglomerator.do_static_merge} before c{c_source} is
+        merged into c{c_target}
+        """
+        self.remove(c_source)
+        if c_target in self.variants:
+            self.dirty.add(c_target)
+        self.dirty.discard(c_source)
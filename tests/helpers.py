@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+
+"""
+helpers
+----------------------------------
+
+Mention factories and the clean-up of c{Agglomerator}'s class-level state,
+shared by the test modules.
+"""
+
+import unittest
+
+from authortoolkit.mention import Mention
+from authortoolkit.agglomerator import Agglomerator
+
+
+def make_mention(alias, article_id, author_id=False):
+    m = Mention()
+    m.load_author_alias(alias)
+    m.article_id = article_id
+    m.author_id = author_id
+    return m
+
+
+def make_mentions(aliases):
+    """One mention per alias, each on its own article
+    """
+    return [make_mention(alias, "a%d" % i) for i, alias in enumerate(aliases)]
+
+
+class AgglomeratorTestCase(unittest.TestCase):
+    """Clears the class-level state of c{Agglomerator} after each test
+    """
+
+    def tearDown(self):
+        Agglomerator.reset()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_agglomerator
+----------------------------------
+
+Tests for `authortoolkit.agglomerator` module.
+"""
+
+import unittest
+
+from authortoolkit import utils, config
+from authortoolkit.cluster import Cluster
+from authortoolkit.agglomerator import Agglomerator, CandidateIndex
+from tests.helpers import make_mentions, AgglomeratorTestCase
+
+
+class TestAgglomerator(AgglomeratorTestCase):
+
+    aliases = ["Wang, J", "Wang, Jun", "Wang, Jun", "Wang, Jing", "Wang, J Q",
+               "Wang, Jun Q", "Wang, Jun Qiang", "Wang, J Qiang X",
+               "Wang, Jun W", "Wang, K", "Wang, Kai Q", "Wong, Jun"]
+
+    def test_compat_map(self):
+        mentions = make_mentions(self.aliases)
+        a = Agglomerator(mentions)
+        a.load_compat_mat()
+        for m1 in mentions:
+            expected = set(m2 for m2 in mentions if utils.compatible_names(m1, m2))
+            self.assertEqual(a.compat_map[m1], expected)
+        # mentions with the same name share their compatible set
+        self.assertTrue(a.compat_map[mentions[1]] is a.compat_map[mentions[2]])
+
+    def test_partition_compat(self):
+        mentions = make_mentions(self.aliases)
+        a = Agglomerator(mentions)
+        c = dict((m, Agglomerator.MENTION_TO_CLUSTER[m]) for m in mentions)
+        j, jun, jun_q, jun_w = c[mentions[0]], c[mentions[1]], c[mentions[5]], c[mentions[8]]
+        self.assertTrue(a.stricter_than(j, jun))
+        self.assertFalse(a.stricter_than(jun, j))
+        self.assertTrue(a.is_equivalent(jun, c[mentions[2]]))
+
+        # merging narrows the cached compatibility of the target
+        a.get_partition_bits(jun)
+        a.do_self_merge(jun_q, jun)
+        self.assertTrue(a.stricter_than(jun_w, jun) is False)
+        self.assertTrue(a.stricter_than(j, jun))
+        self.assertEqual(a.get_partition_bits(jun), a.compat_bits[mentions[5]])
+        for c1 in a.clusters:
+            for c2 in a.clusters:
+                s1, s2 = a.get_partition_compat(c1), a.get_partition_compat(c2)
+                self.assertEqual(a.stricter_than(c1, c2), s1 > s2)
+                self.assertEqual(a.is_equivalent(c1, c2), s1 == s2)
+
+    def test_best_first_merge(self):
+        mentions = make_mentions(["Wang, J", "Wang, Jun", "Wang, Jun", "Wang, Jing",
+                                  "Wang, Jun Q", "Wang, Kai"])
+        a = Agglomerator(mentions)
+        scores = {("jun", "jun"): .95, ("j", "jun"): .9, ("j", "jing"): .91}
+
+        def similarity(c1, c2):
+            self.assertTrue(utils.compatible_names(c1, c2))
+            key = tuple(sorted([c1.fn(), c2.fn()]))
+            return scores.get(key, .5)
+
+        a.run_best_first_merge(similarity, .8)
+        names = sorted(sorted(m.original_name for m in c) for c in a.clusters)
+        # "Wang, J" goes to its best match, "Wang, Jing", before "Wang, Jun"
+        # can claim it
+        self.assertEqual(names, [["Wang, J", "Wang, Jing"],
+                                 ["Wang, Jun", "Wang, Jun", "Wang, Jun Q"],
+                                 ["Wang, Kai"]])
+        self.assertEqual(len(Agglomerator.CLUSTERS), 3)
+
+    def test_best_first_candidates(self):
+        a = Agglomerator(make_mentions(["Wang, J", "Wang, Jing", "Wang, Jun"]))
+        scored = []
+
+        def similarity(c1, c2):
+            scored.append((c1.fn(), c2.fn()))
+            return 1. if c1.fn() == "j" and c2.fn() == "jun" else 0.
+
+        # when approximating, "j" is only scored against the nearest name
+        # after it, and "jun" is not compatible with "jing"
+        limit, config.best_first_candidates = config.best_first_candidates, 1
+        try:
+            a.run_best_first_merge(similarity, .5)
+        finally:
+            config.best_first_candidates = limit
+        self.assertEqual(scored, [("j", "jing")])
+        self.assertEqual(len(a.clusters), 3)
+
+    def test_best_first_scores_every_pair(self):
+        a = Agglomerator(make_mentions(["Wang, Wei"] * 300))
+
+        def similarity(c1, c2):
+            articles = set(m.article_id for m in c1.mentions) | \
+                set(m.article_id for m in c2.mentions)
+            return 1. if articles == set(["a0", "a250"]) else 0.
+
+        # clusters far apart in name order are still merged by default
+        a.run_best_first_merge(similarity, .5)
+        self.assertEqual(len(a.clusters), 299)
+
+    def test_replay_merges(self):
+        def partition(a):
+            return sorted(sorted(m.article_id for m in c) for c in a.clusters)
+
+        def similarity(c1, c2):
+            return 1. if c1.fn()[0] == c2.fn()[0] else 0.
+
+        mentions = make_mentions(self.aliases)
+        a = Agglomerator(mentions)
+        a.merge_log = []
+        a.run_merge(similarity, .5)
+        expected = partition(a)
+        a.discard()
+        self.assertEqual(len(Agglomerator.CLUSTERS), 0)
+        self.assertEqual(len(Agglomerator.MENTION_TO_CLUSTER), 0)
+
+        # the same mentions, loaded in another order, get the same ranks
+        replayed = Agglomerator(list(reversed(mentions)))
+        replayed.replay_merges(a.merge_log)
+        self.assertEqual(partition(replayed), expected)
+        self.assertEqual(len(Agglomerator.CLUSTERS), len(expected))
+
+    def test_canopy_merge(self):
+        mentions = make_mentions(["Wang, J", "Wang, Jun", "Wang, Jun", "Wang, Jun Q",
+                                  "Wang, Jun W Q", "Wang, Jing", "Wang, Jing"])
+        a = Agglomerator(mentions)
+        canopies = [sorted(c.full_name() for c in canopy) for canopy in a.canopies(3)]
+        self.assertEqual(canopies, [["j wang"], ["jing wang", "jing wang"],
+                                    ["jun wang", "jun wang"], ["jun q wang"],
+                                    ["jun w q wang"]])
+        self.assertEqual(len(a.canopies(10)), 1)
+
+        def similarity(c1, c2):
+            return 1. if c1.fn() != "jing" and c2.fn() != "jing" else 0.
+
+        a.run_canopy_merge(a.run_merge, similarity, .5, 3)
+        names = sorted(sorted(m.original_name for m in c) for c in a.clusters)
+        self.assertEqual(names, [["Wang, J", "Wang, Jun", "Wang, Jun", "Wang, Jun Q",
+                                  "Wang, Jun W Q"], ["Wang, Jing"], ["Wang, Jing"]])
+
+    def test_canopies_split_initials(self):
+        mentions = make_mentions(["Wang, J", "Wang, J", "Wang, J", "Wang, J Q",
+                                  "Wang, Jun"])
+        for engine in ["run_merge", "run_best_first_merge"]:
+            a = Agglomerator(mentions)
+            canopies = [sorted(c.full_name() for c in canopy) for canopy in a.canopies(2)]
+            self.assertEqual(canopies, [["j wang", "j wang"], ["j wang"], ["j q wang"],
+                                        ["jun wang"]])
+            # the canopies are reconciled across the splits
+            a.run_canopy_merge(getattr(a, engine), lambda c1, c2: 1., .5, 2)
+            self.assertEqual([c.num_mentions() for c in a.clusters], [5])
+            a.discard()
+
+    def test_canopy_merge_reconciles_every_cluster(self):
+        mentions = make_mentions(["Wang, Jun", "Wang, Jun", "Wang, J"])
+
+        def articles(c1, c2):
+            return sorted(m.article_id for c in (c1, c2) for m in c.mentions)
+
+        # evidence such as coauthors can tell apart clusters with one name;
+        # "j" belongs with either "jun" cluster, in another canopy
+        for engine in ["run_merge", "run_best_first_merge"]:
+            for jun in ["a0", "a1"]:
+                a = Agglomerator(mentions)
+                a.run_canopy_merge(getattr(a, engine),
+                    lambda c1, c2: float(articles(c1, c2) == [jun, "a2"]), .5, 2)
+                clusters = sorted(sorted(m.article_id for m in c.mentions)
+                                  for c in a.clusters)
+                self.assertTrue([jun, "a2"] in clusters)
+                self.assertEqual(len(clusters), 2)
+                a.discard()
+
+    def test_pairs_iter(self):
+        a = Agglomerator(make_mentions(self.aliases))
+        clusters = sorted(a.clusters, key=a.cluster_order)
+        expected = [(c1, c2) for i, c1 in enumerate(clusters)
+                    for c2 in clusters[i + 1:] if utils.compatible_names(c1, c2)]
+        self.assertEqual(list(a.pairs_iter()), expected)
+
+    def test_candidate_index_follows_merges(self):
+        mentions = make_mentions(["Wang, Jun Q", "Wang, Jun W", "Wang, Jun W Q"])
+        a = Agglomerator(mentions)
+        clusters = sorted(a.clusters, key=a.cluster_order)
+        self.assertEqual([c.full_name() for c in clusters],
+                         ["jun q wang", "jun w q wang", "jun w wang"])
+        index = CandidateIndex(clusters)
+        self.assertEqual(index.later(0), [1])
+        self.assertEqual(index.later(1), [2])
+
+        # "jun q" takes the longer middle names of "jun w q", and becomes
+        # compatible with "jun w"
+        a.do_self_merge(clusters[1], clusters[0])
+        index.remove(1)
+        index.update(0)
+        self.assertEqual(index.later(0), [2])
+        self.assertEqual(index.nearby(2), [0])
+        self.assertEqual(index.nearby(0, 1), [2])
+
+    def test_token_index(self):
+        mentions = make_mentions(["Wang, Jun Q", "Wang, Q", "Wang-Li, Jun"])
+        a = Agglomerator(mentions)
+        c = [Agglomerator.MENTION_TO_CLUSTER[m] for m in mentions]
+        self.assertEqual(sorted(Agglomerator.TOKEN_TO_CLUSTERS), ["wang-li_j", "wang_j", "wang_q"])
+
+        Agglomerator.rename(c[0], Cluster.drop_first_name)
+        self.assertEqual(Agglomerator.TOKEN_TO_CLUSTERS["wang_q"], set([c[0], c[1]]))
+        self.assertFalse("wang_j" in Agglomerator.TOKEN_TO_CLUSTERS)
+        a.do_self_merge(c[0], c[1])
+        self.assertEqual(Agglomerator.TOKEN_TO_CLUSTERS["wang_q"], set([c[1]]))
+
+        Agglomerator.rename(c[2], Cluster.drop_hyphenated_ln)
+        Agglomerator.rename(c[2], Cluster.restore_name)
+        self.assertEqual(Agglomerator.TOKEN_TO_CLUSTERS["wang-li_j"], set([c[2]]))
+        a.discard()
+        self.assertEqual(len(Agglomerator.TOKEN_TO_CLUSTERS), 0)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_cluster
+----------------------------------
+
+Tests for `authortoolkit.cluster` module.
+"""
+
+import unittest
+from cPickle import dumps, loads
+
+from authortoolkit.mention import Mention
+from authortoolkit.cluster import Cluster, ClusterView
+from tests.helpers import make_mention
+
+
+class TestCluster(unittest.TestCase):
+
+    def test_compact_layout(self):
+        m = make_mention("Smith, John", "a1")
+        self.assertFalse(hasattr(m, "__dict__"))
+        c = Cluster(m)
+        self.assertEqual(type(c.mentions), tuple)
+
+    def test_extend(self):
+        c1 = Cluster(make_mention("Smith, J", "a1"))
+        c2 = Cluster(make_mention("Smith, John C", "a2"))
+        c3 = Cluster(make_mention("Smith, John", "a2"))
+        c1.extend(c2)
+        self.assertEqual(c1.num_mentions(), 2)
+        self.assertEqual(c1.full_name(), "john c smith")
+        self.assertEqual(c1.shared_articles(c3), set(["a2"]))
+        self.assertEqual(c3.shared_articles(c1), set(["a2"]))
+
+    def test_extend_takes_larger_sets(self):
+        big = Cluster(make_mention("Smith, J", "a1"))
+        for i in range(2, 5):
+            big.extend(Cluster(make_mention("Smith, J", "a%d" % i)))
+        big_mentions = big.mentions
+        small = Cluster(make_mention("Smith, John", "a5"))
+        small.extend(big)
+        self.assertTrue(small.mentions is big_mentions)
+        self.assertEqual(small.num_mentions(), 5)
+        self.assertEqual(small.articles, set(["a1", "a2", "a3", "a4", "a5"]))
+        self.assertEqual(small.full_name(), "john smith")
+
+    def test_view(self):
+        c = Cluster(make_mention("Smith-Jones, J Quentin", "a1"))
+        view = ClusterView(c, Mention.drop_first_name)
+        self.assertEqual(view.full_name(), "quentin smith-jones")
+        self.assertEqual(view.token(), "smith-jones_q")
+        self.assertTrue(view.cluster is c)
+        self.assertEqual(c.full_name(), "j quentin smith-jones")
+
+        right = Cluster(make_mention("Smyth-Jones, J Quentin", "a2"))
+        view = ClusterView(c, lambda p: p.fix_spelling(right))
+        self.assertEqual(view.ln(), "smyth-jones")
+        self.assertEqual(c.ln(), "smith-jones")
+
+    def test_pickle(self):
+        m = make_mention("Smith, John C", "a1")
+        m2 = loads(dumps(m, 2))
+        self.assertEqual(m2.full_name(), m.full_name())
+        self.assertEqual(m2.article_id, "a1")
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_coauthors
+----------------------------------
+
+Tests for `authortoolkit.coauthors` module.
+"""
+
+import unittest
+from collections import defaultdict
+
+from authortoolkit.agglomerator import Agglomerator
+from authortoolkit.coauthors import CoauthorIndex, incidence_matrix
+from tests.helpers import make_mention, AgglomeratorTestCase
+
+
+class TestCoauthorIndex(AgglomeratorTestCase):
+
+    rows = [("a1", "Smith, John"), ("a1", "Wang, Wei"), ("a1", "Li, Qiang"),
+            ("a2", "Smith, J"), ("a2", "Wang, W"), ("a3", "Smith, John"),
+            ("a3", "Li, Q"), ("a4", "Wang, Wei"), ("a4", "Smith, J")]
+
+    def setUp(self):
+        self.article_to_mentions = defaultdict(set)
+        self.mentions = []
+        for article_id, alias in self.rows:
+            m = make_mention(alias, article_id)
+            self.mentions.append(m)
+            self.article_to_mentions[article_id].add(m)
+        self.agg = Agglomerator(self.mentions)
+        self.index = CoauthorIndex(self.article_to_mentions,
+                                   Agglomerator.MENTION_TO_CLUSTER)
+        Agglomerator.LISTENERS.append(self.index.on_merge)
+
+    def cluster(self, i):
+        return Agglomerator.MENTION_TO_CLUSTER[self.mentions[i]]
+
+    def test_merges_keep_index_current(self):
+        for i in range(len(self.mentions)):
+            self.index.get(self.cluster(i))
+
+        # the two Smiths on a2 and a4, then Wang on a1 and a4, then the
+        # Smiths and Wangs into one cluster, which becomes its own coauthor
+        for source, target in [(3, 8), (1, 7), (0, 5), (5, 8), (7, 8)]:
+            self.agg.do_self_merge(self.cluster(source), self.cluster(target))
+            for c in self.agg.clusters:
+                self.assertEqual(dict(self.index.get(c)), dict(self.index.build(c)))
+
+        # a1 and a4 each pair a Smith with a Wang, counted both ways
+        smiths = self.cluster(0)
+        self.assertEqual(self.index.get(smiths)[smiths], 4)
+        self.assertEqual(self.index.num_common(smiths, self.cluster(2)), 1)
+        self.assertEqual(len(self.index.coauthors), len(self.agg.clusters))
+
+    def test_load_and_prepare_pairs(self):
+        mention_index, incidence = incidence_matrix(self.mentions)
+        self.assertEqual(incidence.shape, (9, 4))
+        self.index.load(self.agg.clusters, mention_index, incidence)
+        for c in self.agg.clusters:
+            self.assertEqual(dict(self.index.coauthors[c]), dict(self.index.build(c)))
+
+        def intersections():
+            return dict(((c1, c2), len(set(self.index.build(c1)) & set(self.index.build(c2))))
+                        for c1 in self.agg.clusters for c2 in self.agg.clusters)
+
+        self.index.prepare_pairs(self.agg.clusters)
+        self.assertEqual(len(self.index.prepared), 9)
+        for pair, expected in intersections().items():
+            self.assertEqual(self.index.num_common(*pair), expected)
+
+        # merges invalidate the counts of the clusters whose coauthors change
+        self.agg.do_self_merge(self.cluster(3), self.cluster(8))
+        self.agg.do_self_merge(self.cluster(1), self.cluster(7))
+        self.assertTrue(self.cluster(8) not in self.index.prepared)
+        for pair, expected in intersections().items():
+            self.assertEqual(self.index.num_common(*pair), expected)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
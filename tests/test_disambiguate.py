@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_disambiguate
+----------------------------------
+
+Tests for `authortoolkit.disambiguate` module.
+"""
+
+import unittest
+
+from authortoolkit import disambiguate, config
+from authortoolkit.agglomerator import Agglomerator
+from authortoolkit.cluster import ClusterView
+from authortoolkit.mention import Mention
+from tests.helpers import make_mentions, AgglomeratorTestCase
+
+
+class TestFoldIn(AgglomeratorTestCase):
+
+    def fold_in(self, aliases, moves):
+        """Runs c{run_fold_in} over the clusters of c{aliases}, where c{moves}
+        gives a source, a target and the score of dropping the source's first
+        name; returns the clusters by their aliases
+        """
+        mentions = make_mentions(aliases)
+        Agglomerator(mentions)
+        c = self.c = [Agglomerator.MENTION_TO_CLUSTER[m] for m in mentions]
+        candidates = [(ClusterView(c[i], Mention.drop_first_name), [c[j]])
+                      for i, j, score in moves]
+        scores = dict(((i, j), score) for i, j, score in moves)
+
+        def batch_score(pairs):
+            return [scores[(c.index(view.cluster), c.index(t))] for view, t in pairs]
+
+        disambiguate.run_fold_in(candidates, batch_score)
+        return sorted(sorted(m.original_name for m in p) for p in Agglomerator.CLUSTERS)
+
+    def test_grown_source(self):
+        # "j q" takes the middle names "quentin li" from the first move, so
+        # dropping its first name would give "quentin li", not "q"
+        high, low = config.merge_threshold + .04, config.merge_threshold + .02
+        clusters = self.fold_in(["Wang, X J Quentin Li", "Wang, J Q", "Wang, Qiang"],
+                                [(0, 1, high), (1, 2, low)])
+        self.assertEqual(clusters, [["Wang, J Q", "Wang, X J Quentin Li"],
+                                    ["Wang, Qiang"]])
+
+    def test_grown_target(self):
+        # "j" becomes "j q" in the first move, so "j w" no longer fits it
+        high, low = config.merge_threshold + .04, config.merge_threshold + .02
+        clusters = self.fold_in(["Wang, J", "Wang, X J Q", "Wang, Y J W"],
+                                [(1, 0, high), (2, 0, low)])
+        self.assertEqual(clusters, [["Wang, J", "Wang, X J Q"], ["Wang, Y J W"]])
+        # the source keeps its name, under its old token
+        self.assertEqual(self.c[2].full_name(), "y j w wang")
+        self.assertTrue(self.c[2] in Agglomerator.TOKEN_TO_CLUSTERS["wang_y"])
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
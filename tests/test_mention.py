@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_mention
+----------------------------------
+
+Tests for `authortoolkit.mention` module.
+"""
+
+import pickle
+import cPickle
+import unittest
+
+from authortoolkit import mention, name_parser
+from authortoolkit.mention import Mention, ParsedNameCache
+
+
+class TestParsedNameCache(unittest.TestCase):
+
+    def setUp(self):
+        mention.parsed_names.clear()
+
+    def test_repeated_alias_shares_record(self):
+        m1, m2 = Mention(), Mention()
+        m1.load_author_alias("Smith, John C.")
+        m2.load_author_alias("Smith, John C.")
+        self.assertEqual(m1.full_name(), "john c smith")
+        self.assertTrue(m1.middle_names is m2.middle_names)
+        self.assertEqual(mention.parsed_names.hits, 1)
+        self.assertEqual(mention.parsed_names.misses, 1)
+
+    def test_max_size(self):
+        cache = ParsedNameCache(max_size=1)
+        cache.lookup("a", lambda: ("j", [], "smith", ""))
+        cache.lookup("b", lambda: ("k", [], "smith", ""))
+        self.assertEqual(len(cache.map), 1)
+        self.assertEqual(cache.misses, 2)
+
+    def test_malformed_alias(self):
+        m = Mention()
+        self.assertRaises(mention.MalformedAuthorName,
+                          m.load_author_alias, "Smith")
+
+
+class TestPickle(unittest.TestCase):
+
+    # two mentions pickled by pickle_mentions before Mention had __slots__
+    legacy = ('\x80\x02]q\x01((cauthortoolkit.mention\nMention\nq\x02oq\x03}q\x04(U'
+              '\nfirst_nameq\x05U\x04johnU\tlast_nameq\x06U\x05smithU\x06suffixq\x07U'
+              '\x00U\x0bmerged_nameq\x08U\x12Smith, John Quincyq\tU\roriginal_nameq\nh\tU'
+              '\x0cmiddle_namesq\x0b]q\x0cU\x06quincyq\raU\tauthor_idq\x0eU\x017U\narticle_idq'
+              '\x0fU\x02a1q\x10ub(h\x02oq\x11}q\x12(h\x05U\x01wh\x06U\x04wangh\x07U\x00h\x08U'
+              '\x07Wang, Wq\x13h\nh\x13h\x0b]h\x0eU\x017h\x0fU\x02a2q\x14ube.')
+
+    def test_legacy_pickle(self):
+        for loads in (pickle.loads, cPickle.loads):
+            m1, m2 = loads(self.legacy)
+            self.assertEqual(type(m1), Mention)
+            self.assertEqual(m1.mns(), ("quincy",))
+            self.assertEqual(m1.full_name(), "john quincy smith")
+            self.assertEqual(m1.token(), "smith_j")
+            self.assertEqual((m1.article_id, m1.author_id), ("a1", "7"))
+            self.assertEqual(m2.mns(), ())
+            self.assertEqual(m2.original_name, "Wang, W")
+
+
+class TestNameParser(unittest.TestCase):
+
+    cases = [
+        ("Smith, John C.", ("john", ["c"], "smith", "")),
+        ("Dr. JC Smith", ("j", ["c"], "smith", "")),
+        ("van der Berg, Jan", ("janice", [], "berg", "")),
+        ("Ren\xc3\xa9 de la Cruz Jr", ("rene", [], "cruz", "jr")),
+        ("Smith J C", ("j", ["c"], "smith", "")),
+        ("Tony  Smith-Jones", ("anthony", [], "smith-jones", "")),
+        ("Mrs. Anna - Maria Li", ("anna", ["maria"], "li", "")),
+    ]
+
+    def test_split_name(self):
+        for name_str, expected in self.cases:
+            self.assertEqual(name_parser.split_name(name_str), expected)
+
+    def test_split_names(self):
+        names = [name_str for name_str, _ in self.cases] + ["Smith"]
+        expected = [parsed for _, parsed in self.cases] + [None]
+        self.assertEqual(name_parser.split_names(names), expected)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
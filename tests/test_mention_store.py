@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_mention_store
+----------------------------------
+
+Tests for `authortoolkit.mention_store` module.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from authortoolkit.mention import Mention
+from authortoolkit import mention_store
+
+
+class TestMentionStore(unittest.TestCase):
+
+    aliases = [("a1", "Smith, John C.", "7"), ("a1", "Wang Wei", "8"),
+               ("a2", "J. C. Smith", False), ("a3", "Smith, J", "7")]
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "names.mentions")
+        self.mentions = []
+        for article_id, alias, author_id in self.aliases:
+            m = Mention()
+            m.load_author_alias(alias)
+            m.article_id, m.author_id = article_id, author_id
+            self.mentions.append(m)
+
+        writer = mention_store.MentionStoreWriter(self.path, chunk_size=3)
+        writer.add_all(self.mentions)
+        writer.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def key(self, m):
+        return (m.article_id, m.author_id, m.original_name, m.fn(),
+                m.mns(), m.ln(), m.suffix)
+
+    def test_round_trip(self):
+        self.assertTrue(mention_store.is_mention_store(self.path))
+        reader = mention_store.MentionStoreReader(self.path)
+        self.assertEqual(reader.num_chunks(), 2)
+        self.assertEqual(len(reader), 4)
+        self.assertEqual(sorted(self.key(m) for m in reader),
+                         sorted(self.key(m) for m in self.mentions))
+
+    def test_read_block(self):
+        reader = mention_store.MentionStoreReader(self.path)
+        block = reader.read_block("smith_j")
+        self.assertEqual(sorted(m.article_id for m in block),
+                         ["a1", "a2", "a3"])
+        self.assertEqual(reader.block_size("smith_j"), 3)
+        self.assertEqual(reader.read_block("smith_q"), [])
+
+    def many_mentions(self):
+        mentions = []
+        for i in xrange(60):
+            m = Mention()
+            m.load_author_alias("%s, %s" % (["Smith", "Wang", "Li", "Jones", "Brown",
+                                             "Lee", "Chen"][i % 7], "jkl"[i % 3]))
+            m.article_id, m.author_id = "a%d" % i, False
+            mentions.append(m)
+        return mentions
+
+    def test_blocks_are_contiguous(self):
+        mentions = self.many_mentions()
+        path = os.path.join(self.tmp_dir, "spilled.mentions")
+        # at most 5 mentions are held at once, so buckets spill many times
+        writer = mention_store.MentionStoreWriter(path, chunk_size=5, num_buckets=3)
+        writer.add_all(mentions)
+        writer.close()
+        # the spilled buckets are cleaned up
+        self.assertEqual(sorted(os.listdir(self.tmp_dir)),
+                         ["names.mentions", "spilled.mentions"])
+
+        reader = mention_store.MentionStoreReader(path)
+        tokens = [m.token() for m in reader]
+        runs = [t for j, t in enumerate(tokens) if j == 0 or tokens[j - 1] != t]
+        self.assertEqual(len(runs), len(set(tokens)))
+        for token in set(tokens):
+            block = reader.read_block(token)
+            self.assertEqual(sorted(m.article_id for m in block),
+                             sorted(m.article_id for m in mentions if m.token() == token))
+            self.assertTrue(len(reader.token_rows[token]) <= 2)
+        self.assertEqual(sorted(self.key(m) for m in reader),
+                         sorted(self.key(m) for m in mentions))
+
+    def test_shards(self):
+        mentions = self.many_mentions()
+        path = os.path.join(self.tmp_dir, "direct.mentions")
+        writer = mention_store.MentionStoreWriter(path, chunk_size=5, num_buckets=3)
+        writer.add_all(mentions)
+        writer.close()
+
+        # the middle third is spilled by another writer, as by a worker
+        path = os.path.join(self.tmp_dir, "sharded.mentions")
+        writer = mention_store.MentionStoreWriter(path, chunk_size=5, num_buckets=3)
+        writer.add_all(mentions[:20])
+        shard_writer = mention_store.MentionStoreWriter(
+            writer.temp_path("range1"), chunk_size=5, num_buckets=3)
+        shard_writer.add_all(mentions[20:40])
+        writer.add_shards(shard_writer.close_shards())
+        writer.add_all(mentions[40:])
+        writer.close()
+        self.assertEqual(sorted(os.listdir(self.tmp_dir)),
+                         ["direct.mentions", "names.mentions", "sharded.mentions"])
+
+        direct = mention_store.MentionStoreReader(os.path.join(self.tmp_dir, "direct.mentions"))
+        sharded = mention_store.MentionStoreReader(path)
+        self.assertEqual([self.key(m) for m in sharded], [self.key(m) for m in direct])
+        self.assertEqual(sharded.token_rows, direct.token_rows)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
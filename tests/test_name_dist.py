@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_name_dist
+----------------------------------
+
+Tests for `authortoolkit.name_dist` module.
+"""
+
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from authortoolkit.mention import Mention
+from authortoolkit.name_dist import PriorNameDist, Counter, SketchCounter
+from authortoolkit import name_table, batch_scoring, config
+
+
+def make_pnd(aliases):
+    pnd = PriorNameDist()
+    for alias in aliases:
+        m = Mention()
+        m.load_author_alias(alias)
+        pnd.add_mention(m)
+    return pnd
+
+
+class TestPriorNameDist(unittest.TestCase):
+
+    aliases = ["Smith, John C", "Wang, Wei", "J Smith", "Li, Wei Q",
+               "Jones, Mary Ann"]
+
+    def test_merge(self):
+        whole = make_pnd(self.aliases)
+        merged = make_pnd(self.aliases[:2])
+        merged.merge(make_pnd(self.aliases[2:]))
+        for attr in ("fn_map", "fl_map", "ln_map"):
+            c1, c2 = getattr(whole, attr), getattr(merged, attr)
+            self.assertEqual(dict(c1.map), dict(c2.map))
+            self.assertEqual(c1.total, c2.total)
+
+    def test_mapped_tables(self):
+        pnd = make_pnd(self.aliases)
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, "names.tables")
+            name_table.write_tables(path, pnd.table_pieces())
+            self.assertTrue(name_table.is_table_file(path))
+            mapped = PriorNameDist()
+            mapped.load_pieces(name_table.open_tables(path))
+            for key in ["smith", "wang", "li", "nobody", ""]:
+                self.assertEqual(mapped.ln_map.get_prop(key),
+                                 pnd.ln_map.get_prop(key))
+            self.assertTrue("wei" in mapped.fl_map.map)
+            self.assertFalse("nobody" in mapped.fl_map.map)
+            self.assertEqual(sorted(mapped.ln_map.map), ["jones", "li", "smith", "wang"])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_precomputed_neighborhoods(self):
+        aliases = self.aliases + ["Smyth, Jon C", "Smith, Jonn", "Wang, Wie"]
+        names = []
+        for alias in aliases + ["Smiht, Jhon C", "Wnag, Wie Q"]:
+            m = Mention()
+            m.load_author_alias(alias)
+            names.append(m)
+        pairs = [(p1, p2) for p1 in names for p2 in names]
+
+        pnd = make_pnd(aliases)
+        pnd.load_spellers()
+        expected = [pnd.misspelled_prob_same(p1, p2) for p1, p2 in pairs]
+
+        pre = make_pnd(aliases)
+        pre.precompute_neighborhoods()
+        self.assertEqual(sorted(pre.masses), ["fn_mass", "ln_mass", "mn_mass"])
+        self.assertEqual([pre.misspelled_prob_same(p1, p2) for p1, p2 in pairs],
+                         expected)
+
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, "names.tables")
+            name_table.write_tables(path, pre.table_pieces())
+            mapped = PriorNameDist()
+            mapped.load_pieces(name_table.open_tables(path))
+            self.assertEqual(len(mapped.masses), 3)
+            self.assertEqual([mapped.misspelled_prob_same(p1, p2) for p1, p2 in pairs],
+                             expected)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_batch_prob_same(self):
+        pnd = make_pnd(self.aliases)
+        names = []
+        for alias in ["Smith, John C", "Smith, J C", "Smith, J", "Smith, Jo",
+                      "Wang, Wei", "Wang, W Q", "Smith, Zed Q R"]:
+            m = Mention()
+            m.load_author_alias(alias)
+            names.append(m)
+        pairs = [(p1, p2) for p1 in names for p2 in names if p1.ln() == p2.ln()]
+
+        encoder = batch_scoring.NameEncoder(pnd)
+        batch = encoder.pairs_prob_same(pairs)
+        for (p1, p2), prob in zip(pairs, batch):
+            expected = 1. / (1. + config.expected_authors * pnd.common_prob_gen(p1, p2))
+            self.assertAlmostEqual(prob, expected, places=12)
+
+        # the arrays grow past their initial size, and scores computed
+        # before keep their values
+        for i in range(100):
+            m = Mention()
+            m.load_author_alias("Name%s, Given%s" % ("x" * i, "y" * i))
+            encoder.encode(m)
+        self.assertTrue(encoder.num_given > 64 and encoder.num_last > 64)
+        rows1, rows2 = zip(*[(names.index(p1), names.index(p2)) for p1, p2 in pairs])
+        indexed = encoder.indexed_prob_same(names, list(rows1), list(rows2))
+        for prob, expected in zip(indexed, batch):
+            self.assertAlmostEqual(prob, expected, places=12)
+
+
+class TestSketchCounter(unittest.TestCase):
+
+    def setUp(self):
+        self.names = ["smith"] * 50 + ["wang"] * 30 + \
+            ["name%d" % i for i in range(200)]
+
+    def counters(self, names):
+        exact = Counter()
+        sketch = SketchCounter(epsilon=0.05, delta=0.01, heavy_count=10)
+        for name in names:
+            exact.incr(name)
+            sketch.incr(name)
+        return exact, sketch
+
+    def test_bounds(self):
+        exact, sketch = self.counters(self.names)
+        self.assertEqual(sketch.total, exact.total)
+        self.assertEqual(sorted(sketch.map), ["smith", "wang"])
+        for name in set(self.names) | set(["nobody"]):
+            self.assertTrue(sketch.count(name) >= exact.count(name))
+            self.assertTrue(sketch.count(name) <= exact.count(name) + .05 * exact.total)
+
+    def test_merge(self):
+        exact, whole = self.counters(self.names)
+        _, merged = self.counters(self.names[:60])
+        merged.merge(self.counters(self.names[60:])[1])
+        self.assertEqual(merged.total, whole.total)
+        for name in set(self.names):
+            self.assertTrue(merged.count(name) >= exact.count(name))
+        self.assertRaises(ValueError, merged.merge, SketchCounter(epsilon=0.5))
+
+    def test_pieces(self):
+        pnd = PriorNameDist(lambda: SketchCounter(epsilon=0.01))
+        for alias in ["Smith, John C", "Wang, Wei", "J Smith"]:
+            m = Mention()
+            m.load_author_alias(alias)
+            pnd.add_mention(m)
+        loaded = PriorNameDist()
+        loaded.load_pieces(pickle.loads(pickle.dumps(pnd.pieces(), 2)))
+        self.assertEqual(loaded.ln_map.get_prop("smith"), pnd.ln_map.get_prop("smith"))
+        self.assertEqual(loaded.ln_map.count("smith"), 2)
+        self.assertRaises(ValueError, pnd.table_pieces)
+
+    def test_rare_names(self):
+        # misspellings are rare, so stay below heavy_count, but the spellers
+        # and neighborhoods still know them
+        aliases = ["Smith, John"] * 20 + ["Smiht, Jhon", "Smyth, John"]
+        sketched = PriorNameDist(lambda: SketchCounter(epsilon=0.01, heavy_count=10))
+        sketched.merge(PriorNameDist(lambda: SketchCounter(epsilon=0.01, heavy_count=10)))
+        for alias in aliases:
+            m = Mention()
+            m.load_author_alias(alias)
+            sketched.add_mention(m)
+        self.assertEqual(sorted(sketched.ln_map.map), ["smith"])
+        self.assertEqual(sorted(sketched.ln_map.vocabulary()), ["smiht", "smith", "smyth"])
+
+        sketched.precompute_neighborhoods()
+        self.assertEqual(sorted(sketched.ln_sp.candidates("smith")), ["smiht", "smyth"])
+        self.assertEqual(sorted(sketched.masses["ln_mass"]), ["smiht", "smith", "smyth"])
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_speller
+----------------------------------
+
+Tests for `authortoolkit.speller` module.
+"""
+
+import unittest
+
+from authortoolkit import speller
+
+
+class TestDeletionSpeller(unittest.TestCase):
+
+    vocab = set(["smith", "smyth", "smiht", "smit", "smiths", "schmidt",
+                 "john smith", "jon smith", "wang", "wong", "wan"])
+
+    def test_same_as_edits1(self):
+        old = speller.Speller(self.vocab)
+        new = speller.DeletionSpeller(self.vocab)
+        for word in ["smith", "smth", "wang", "wnag", "john smith",
+                     "johnsmith", "xyz", ""]:
+            self.assertEqual(sorted(new.candidates(word)),
+                             sorted(old.candidates(word)))
+
+    def test_distance_two(self):
+        sp = speller.DeletionSpeller(self.vocab, max_distance=2)
+        self.assertEqual(sorted(sp.candidates("smth", 2)),
+                         ["smiht", "smit", "smith", "smiths", "smyth"])
+        self.assertRaises(ValueError, speller.DeletionSpeller(self.vocab).candidates,
+                          "smth", 2)
+
+    def test_osa_distance(self):
+        self.assertEqual(speller.osa_distance("smith", "smiht"), 1)
+        self.assertEqual(speller.osa_distance("smith", "schmidt"), 4)
+        self.assertEqual(speller.osa_distance("", "wan"), 3)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
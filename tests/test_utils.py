@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_utils
+----------------------------------
+
+Tests for `authortoolkit.utils` module.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from authortoolkit import utils
+
+
+class TestLineRanges(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "names.tsv")
+        self.lines = ["%d\tSmith, J\t%d\n" % (i, i % 7) for i in xrange(50)]
+        handle = open(self.path, "w")
+        handle.write("".join(self.lines))
+        handle.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_ranges_cover_lines_once(self):
+        for num_ranges in (1, 3, 8, 200):
+            ranges = utils.line_ranges(self.path, num_ranges)
+            self.assertTrue(len(ranges) <= num_ranges)
+            lines = []
+            for start, end in ranges:
+                lines.extend(utils.read_lines(self.path, start, end))
+            self.assertEqual(lines, self.lines)
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_eviction_order(self):
+        cache = utils.LRUCache(max_size=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.put("c", 3)
+        self.assertEqual(cache.get("b"), None)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual((cache.hits, cache.misses, cache.evictions), (3, 1, 1))
+
+    def test_unbounded(self):
+        cache = utils.LRUCache()
+        for i in xrange(100):
+            cache.put(i, i)
+        self.assertEqual(len(cache), 100)
+        self.assertEqual(cache.evictions, 0)
+
+
+class TestDisjointSet(unittest.TestCase):
+
+    def test_union(self):
+        ds = utils.DisjointSet()
+        for x in "abcde":
+            ds[x] = x.upper()
+        ds.union("a", "b", "AB")
+        ds.union("c", "d", "CD")
+        ds.union("b", "d", "ABCD")
+        for x in "abcd":
+            self.assertEqual(ds[x], "ABCD")
+        self.assertEqual(ds["e"], "E")
+        self.assertEqual(ds.get("z"), None)
+        # the larger set's root is kept, and paths are compressed
+        root = ds.find("a")
+        self.assertEqual(ds.sizes[root], 4)
+        self.assertTrue(all(ds.parents[x] is root for x in "abcd"))
+        self.assertRaises(ValueError, ds.__setitem__, "a", "A")
+
+        ds.remove_sets("abcd")
+        self.assertEqual(len(ds), 1)
+        self.assertFalse("a" in ds)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())
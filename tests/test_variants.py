@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_variants
+----------------------------------
+
+Tests for `authortoolkit.variants` module.
+"""
+
+import unittest
+
+from authortoolkit.agglomerator import Agglomerator
+from authortoolkit.variants import VariantIndex
+from tests.helpers import make_mentions, AgglomeratorTestCase
+
+
+class TestVariantIndex(AgglomeratorTestCase):
+
+    aliases = ["Smith, John Q", "Smyth, John Q", "Smiht, J", "Smith, Jon",
+               "Wang, Wei"]
+
+    def setUp(self):
+        self.mentions = make_mentions(self.aliases)
+        self.agg = Agglomerator(self.mentions)
+        self.c = [Agglomerator.MENTION_TO_CLUSTER[m] for m in self.mentions]
+        self.index = VariantIndex(self.agg.clusters)
+        Agglomerator.LISTENERS.append(self.index.on_merge)
+
+    def test_misspelling_targets(self):
+        c = self.c
+        self.assertEqual(self.index.misspelling_targets(c[1]), set([c[0]]))
+        self.assertEqual(self.index.misspelling_targets(c[2]), set([c[0], c[3]]))
+        self.assertEqual(self.index.misspelling_targets(c[4]), set())
+        self.assertTrue(self.index.parsed("j smith") is self.index.parsed("j smith"))
+
+    def test_merges_keep_index_current(self):
+        c = self.c
+        # "Smith, J" takes the longer names of "Smith, John Q", and the
+        # renamed "Smyth" leaves no trace of its old name
+        Agglomerator.rename(c[1], lambda p: p.fix_spelling(c[0]))
+        self.agg.do_self_merge(c[1], c[0])
+        self.assertEqual(self.index.misspelling_targets(c[3]), set([c[0]]))
+        self.assertFalse(c[1] in self.index.clusters["john q smyth"])
+
+        # the target is reindexed under its longer name on the next lookup
+        self.agg.do_self_merge(c[0], c[2])
+        self.assertEqual(self.index.misspelling_targets(c[3]), set())
+        self.assertEqual(self.index.clusters["john smiht"], set([c[2]]))
+        self.assertEqual(self.index.clusters["john smith"], set())
+        self.assertEqual(self.index.variants[c[2]], c[2].name_variants())
+        self.assertEqual(len(self.index.variants), 3)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(unittest.main())